@@ -0,0 +1,299 @@
+'''
+Headless backtester, replays quote streams through the same Tick.update/toBuy/toSell
+the GUI uses and does the same accounting as MainWindow.purchase/sell, without Qt
+or the network
+
+    $ python Backtest.py --syms 300 --steps 4680
+    $ python Backtest.py --bars bars.h5 --day 20181016
+    $ python Backtest.py --tape tapes/20181016.h5
+'''
+import argparse, logging, time
+from collections import namedtuple
+import numpy as np
+from Tick import Tick, STACK_CAPACITY, DEFAULT_PARAMS
+from TickList import TickList
+
+
+#One fill, stamp being epoch ms
+Trade = namedtuple('Trade', ['stamp', 'sym', 'side', 'qty', 'price', 'profit'])
+
+Result = namedtuple('Result', ['profit', 'trades', 'updates', 'seconds'])
+
+
+def quote(price, prevClose, low, high):
+    #Quote data in the shape robinTicks gives it to Tick.update
+    change = round(price - prevClose, 2)
+    return {
+        'LTP' : price,
+        'LAP' : round(price + 0.01, 2) if price > 1 else price + 0.0001,
+        'C' : change,
+        'CP' : round((change / price) * 100, 2),
+        'PC' : prevClose,
+        'TH' : high,
+        'TL' : low,
+        'YH' : '',
+        'YL' : '',
+        'V' : 0,
+        'D' : 'G' if change > 0 else 'R'
+    }
+
+
+def synthetic(syms = 100, steps = 4680, interval = 5, seed = 0, start = None):
+    '''
+    Random walk quotes for a made up universe, one step every interval seconds.
+    A trading day at 5 second updates is 4680 steps
+
+    Args:
+        syms (int/list): how many symbols to make, or the symbols themselves
+        steps (int): how many quote updates each symbol gets
+        interval (int): seconds between updates
+        seed (int): random seed, the same seed gives the same stream
+        start (int): epoch ms of the first step, 0930 today if None
+
+    Yields:
+        (tuple): (epoch ms, {Sym : quote data})
+    '''
+    rng = np.random.RandomState(seed)
+    if isinstance(syms, int):
+        syms = ['S{:03}'.format(i) for i in range(syms)]
+    if start is None:
+        start = int(time.mktime(time.localtime()[:3] + (9, 30, 0, 0, 0, -1)) * 1000)
+
+    #Some pennies, mostly regular stocks, each with its own volatility and drift
+    prevClose = np.where(rng.rand(len(syms)) < 0.1, rng.uniform(0.2, 1, len(syms)), rng.uniform(5, 300, len(syms)))
+    vol = rng.uniform(0.0005, 0.003, len(syms))
+    drift = rng.normal(0, 0.00005, len(syms))
+    prices = prevClose * np.exp(np.cumsum(drift + vol * rng.randn(steps, len(syms)), axis = 0))
+    prices = np.where(prices > 1, prices.round(2), prices.round(4))
+    lows, highs = np.minimum.accumulate(prices), np.maximum.accumulate(prices)
+
+    for step in range(steps):
+        yield start + step * interval * 1000, {
+            sym : quote(float(prices[step, i]), float(prevClose[i]), float(lows[step, i]), float(highs[step, i]))
+            for i, sym in enumerate(syms)
+        }
+
+
+def fromBars(store, syms = None, interval = 60, day = None):
+    '''
+    Quotes from the closes kept in a BarStore, bars of every symbol are merged
+    in time order
+
+    Args:
+        store (BarStore): store the bars are in
+        syms (list): symbols to replay, everything in the store if None
+        interval (int): seconds per bar
+        day (str): YYYYMMDD, each symbol's latest day if None
+
+    Yields:
+        (tuple): (epoch ms, {Sym : quote data})
+    '''
+    closes = {}
+    for sym in (syms or list(store.file)):
+        bars = store.read(sym, interval, day)
+        if len(bars):
+            closes[sym] = bars
+
+    steps = np.unique(np.concatenate([bars['T'] for bars in closes.values()])) if closes else []
+    pos = {sym : 0 for sym in closes}
+    for stamp in steps:
+        quotes = {}
+        for sym, bars in closes.items():
+            i = pos[sym]
+            if i < len(bars) and bars['T'][i] == stamp:
+                pos[sym] = i + 1
+                quotes[sym] = quote(float(bars['Close'][i]), float(bars['Open'][0]),
+                                    float(bars['Low'][:i + 1].min()), float(bars['High'][:i + 1].max()))
+        yield int(stamp), quotes
+
+
+class Backtest():
+    '''
+    Plays quotes through a Queue and Holdings of Ticks the way MainWindow's Hold
+    and Queue cycles do, filling every order at the current price
+
+    Args:
+        purPrice (float): amount spent on each purchase, Limit/Purchase
+        budget (float): most that can be spent in the day, 0 for no budget
+        cash (float): cash to start with
+        buyingPower (float): day trading buying power to start with
+        spy (str): S&P direction, G or R
+        rebuy (bool): whether sold ticks go back on the Queue
+        capacity (int): how many prices each Tick holds on to
+        warmup (int): prices a Tick needs before it's considered for purchase, live
+            ones start out with the day's bars already in their stack
+        params (Params): strategy constants the Ticks are given
+    '''
+    def __init__(self, purPrice = 1000, budget = 0, cash = 25000, buyingPower = 100000,
+                 spy = 'G', rebuy = True, capacity = STACK_CAPACITY, warmup = 5, params = DEFAULT_PARAMS):
+        self.purPrice = purPrice
+        self.budget = budget or 99999999
+        self.cash = cash
+        self.buyingPower = buyingPower
+        self.spy = spy
+        self.rebuy = rebuy
+        self.capacity = capacity
+        self.warmup = warmup
+        self.params = params
+
+        self.qTicks, self.hTicks = TickList(), TickList()
+        self.trades = []
+        self.profit, self.totalCost, self._dtCost = 0, 0, 0
+        self.updates = 0
+        self.stamp = None
+        #Every symbol that's been given a Tick
+        self._known = set()
+
+
+    def tick(self, sym):
+        #Gets the sym's Tick, putting a new one on the Queue if it's never been seen
+        tick = self.hTicks.get(sym) or self.qTicks.get(sym)
+        if tick is None:
+            tick = Tick(sym, self.purPrice, spy = self.spy, capacity = self.capacity, params = self.params)
+            self.qTicks.append(tick)
+            self._known.add(sym)
+        return tick
+
+
+    def purchase(self, tick):
+        #MainWindow.purchase, an immediate fill at the tick's price
+        cost = tick.Q * tick.AP
+        self.qTicks.moveTo(tick, self.hTicks)
+        self._dtCost += cost
+        self.totalCost += cost
+        self.cash -= cost
+        self.buyingPower -= cost
+        self.trades.append(Trade(self.stamp, tick.T, 'Buy', tick.Q, tick.AP, 0))
+
+
+    def sell(self, tick):
+        #MainWindow.sell, an immediate fill at the tick's price
+        profit = float(tick.Q * tick.C) - float(tick.Q * tick.AP)
+        self.profit += profit
+        self.totalCost -= tick.Q * tick.C
+        self.cash += tick.Q * tick.C
+        self.trades.append(Trade(self.stamp, tick.T, 'Sell', tick.Q, tick.C, profit))
+
+        if self.rebuy:
+            self.hTicks.moveTo(tick, self.qTicks)
+        else:
+            self.hTicks.remove(tick)
+        tick.close()
+
+
+    def step(self, stamp, quotes):
+        '''
+        One cycle, Holdings are checked for sales then the Queue for purchases
+
+        Args:
+            stamp (int): epoch ms of the quotes
+            quotes (dict): {Sym : quote data}
+
+        Returns:
+            None
+        '''
+        self.stamp = stamp
+        for sym in quotes.keys() - self._known:
+            self.tick(sym)
+
+        #Ticks sold this step have already seen the quote
+        seen = set()
+        for tick in self.hTicks:
+            data = quotes.get(tick.T)
+            if data is None:
+                continue
+            tick.update(data, self.purPrice, self.spy, bars = False, stamp = stamp)
+            seen.add(tick.T)
+            self.updates += 1
+            if tick.tradeable and tick.toSell(purPrice = self.purPrice, spy = self.spy):
+                self.sell(tick)
+
+        for tick in self.qTicks:
+            data = quotes.get(tick.T)
+            if data is None or tick.T in seen:
+                continue
+            tick.update(data, self.purPrice, self.spy, bars = False, stamp = stamp)
+            self.updates += 1
+            if len(tick.stack) < self.warmup:
+                continue
+            transPrice = tick.C * tick.PQ
+            if self._dtCost + transPrice < self.budget and transPrice < self.buyingPower \
+                    and transPrice < self.cash:
+                if tick.toBuy(purPrice = self.purPrice, spy = self.spy):
+                    self.purchase(tick)
+
+
+    def dump(self):
+        #Sells everything still held, like the 1558 dump
+        for tick in self.hTicks:
+            if tick.tradeable:
+                self.sell(tick)
+
+
+    def run(self, stream, dump = True):
+        '''
+        Replays a whole stream
+
+        Args:
+            stream (iterable): (epoch ms, {Sym : quote data}) in time order
+            dump (bool): whether to sell whatever's still held at the end
+
+        Returns:
+            (Result): profit, trades, how many Tick updates and how long it took
+        '''
+        start = time.perf_counter()
+        for stamp, quotes in stream:
+            self.step(stamp, quotes)
+        if dump:
+            self.dump()
+
+        return Result(self.profit, list(self.trades), self.updates, time.perf_counter() - start)
+
+
+def report(result, trades = False):
+    #Prints the results, and every trade if asked to
+    sells = [trade for trade in result.trades if trade.side == 'Sell']
+    wins = sum(1 for trade in sells if trade.profit > 0)
+    print('Profit: {:.2f}'.format(result.profit))
+    print('Trades: {} buys, {} sells, {} winners ({:.0%})'.format(
+        len(result.trades) - len(sells), len(sells), wins, wins / len(sells) if sells else 0))
+    print('Replayed {} tick updates in {:.2f}s, {:,.0f} ticks/sec'.format(
+        result.updates, result.seconds, result.updates / result.seconds if result.seconds else 0))
+    if trades:
+        for trade in result.trades:
+            print('{} {:4} {:6} {:5} @ {:<10} {:.2f}'.format(
+                time.strftime('%H:%M:%S', time.localtime(trade.stamp / 1000)),
+                trade.side, trade.sym, trade.qty, trade.price, trade.profit))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Replays quotes through the Tick strategy')
+    parser.add_argument('--syms', type = int, default = 100, help = 'synthetic symbols')
+    parser.add_argument('--steps', type = int, default = 4680, help = 'synthetic updates per symbol')
+    parser.add_argument('--interval', type = int, default = 5, help = 'seconds between synthetic updates')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--bars', help = 'replay a BarStore file instead')
+    parser.add_argument('--day', help = 'YYYYMMDD day of the bars, the latest if not given')
+    parser.add_argument('--tape', help = 'replay a recorded tape file, or a folder of them')
+    parser.add_argument('--purPrice', type = float, default = 1000)
+    parser.add_argument('--budget', type = float, default = 0)
+    parser.add_argument('--cash', type = float, default = 25000)
+    parser.add_argument('--spy', default = 'G', choices = ['G', 'R'])
+    parser.add_argument('--no-rebuy', dest = 'rebuy', action = 'store_false')
+    parser.add_argument('--trades', action = 'store_true', help = 'print every trade')
+    args = parser.parse_args()
+
+    #The strategy logs every decision, which would swamp the replay
+    logging.basicConfig(level = logging.WARNING)
+
+    if args.tape:
+        from resources.Tape import TapeReader
+        stream = TapeReader(args.tape).quotes()
+    elif args.bars:
+        from resources.Bars import BarStore
+        stream = fromBars(BarStore(args.bars), day = args.day)
+    else:
+        stream = synthetic(args.syms, args.steps, args.interval, args.seed)
+
+    test = Backtest(args.purPrice, args.budget, args.cash, spy = args.spy, rebuy = args.rebuy)
+    report(test.run(stream), args.trades)
@@ -1,5 +1,6 @@
 from PyQt5 import uic, QtCore, QtGui, QtWidgets
-import json, re, os, logging
+import pyqtgraph as pg
+import json, re, os, logging, datetime, time
 
 
 class AddTick(*uic.loadUiType('ui/addtick.ui')[::-1]):
@@ -112,21 +113,196 @@ class Api(*uic.loadUiType('ui/api.ui')[::-1]):
             )
 
 
-class TimeThread(QtCore.QThread):
-    #Threaded Timer, allows for background updates every 5 seconds, can be changed
-    update = QtCore.pyqtSignal()
+class Job():
+    #Book-keeping for one of the Scheduler's cycles, times are in seconds
+    def __init__(self, name, fn, target, most):
+        self.name = name
+        self.fn = fn
+        self.target = target
+        self.most = most
+        self.interval = target
+        self.timer = None
+        #Whether a run is still out, and whether another came due while it was
+        self.running = self.overdue = self.failed = False
+        self.started = None
+        #Moving averages of how long runs take and how far apart they start
+        self.latency = self.cadence = None
+        self.errors = 0
+        self.runs = self.coalesced = self.failures = 0
 
-    def __init__(self, int = 5, parent = None):
-        QtCore.QThread.__init__(self, parent)
-        self.parent = parent
-        self.int = int * 1000
 
-    def run(self):
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update.emit)
-        self.timer.start(self.int)
-        
-        self.exec_()
+class Scheduler(QtCore.QObject):
+    '''
+    Runs each of the update cycles on its own cadence, replaces the old fixed
+    5 second TimeThread
+
+    A job's function is called on the GUI thread and can hand back a Worker, which
+    is started here once the job's listening for it to finish. The job isn't run
+    again until that Worker finishes. Runs that come
+    due in the meantime are merged into one that starts as soon as it's done.
+    Each interval stretches to fit how long the runs actually take, doubles for
+    every error in a row and is multiplied by `idle` while `quiet()` is True
+
+    Args:
+        pool (QThreadPool): where the jobs' Workers are started
+        quiet (function): returns True while the market's closed
+        idle (float): how much slower the jobs run while it's quiet
+        headroom (float): how much longer than a run's latency its interval is kept
+        report (float): seconds between logging the stats, 0 to never
+    '''
+    _failed = QtCore.pyqtSignal(str)
+    _finished = QtCore.pyqtSignal(str)
+    ALPHA = 0.3
+
+    def __init__(self, pool, quiet = None, idle = 6, headroom = 1.5, report = 300, parent = None):
+        QtCore.QObject.__init__(self, parent)
+        self.pool = pool
+        self.quiet = quiet or (lambda: False)
+        self.idle = idle
+        self.headroom = headroom
+        self.jobs = {}
+
+        self._failed.connect(self.fail)
+        self._finished.connect(self._done)
+
+        self._reporter = QtCore.QTimer(self)
+        self._reporter.timeout.connect(self.log)
+        if report:
+            self._reporter.start(int(report * 1000))
+
+
+    def add(self, name, fn, target, most = 60):
+        '''
+        Adds a job, it's first run the next time the event loop is free
+
+        Args:
+            name (str): name of the job
+            fn (function): runs the job, returns its Worker unstarted or None if it was done inline
+            target (float): seconds between runs when everything's going well
+            most (float): the most seconds the interval can be stretched to
+
+        Returns:
+            None
+        '''
+        job = Job(name, fn, target, most)
+        job.timer = QtCore.QTimer(self)
+        job.timer.setSingleShot(True)
+        job.timer.timeout.connect(lambda: self._run(job))
+        self.jobs[name] = job
+        job.timer.start(0)
+
+
+    def trigger(self, name):
+        #Runs the job now, or right after the run that's still out
+        self._run(self.jobs[name])
+
+
+    def stop(self):
+        for job in self.jobs.values():
+            job.timer.stop()
+        self._reporter.stop()
+
+
+    def _ewma(self, old, new):
+        return new if old is None else old + self.ALPHA * (new - old)
+
+
+    def _run(self, job):
+        if job.running:
+            #Already going, runs once more as soon as it's done
+            if not job.overdue:
+                job.coalesced += 1
+            job.overdue = True
+            return
+
+        job.timer.stop()
+        now = time.monotonic()
+        if job.started is not None:
+            job.cadence = self._ewma(job.cadence, now - job.started)
+        job.started, job.running, job.overdue, job.failed = now, True, False, False
+        job.runs += 1
+
+        try:
+            worker = job.fn()
+        except Exception as e:
+            logging.error('~~~~ {} Job Error: {} ~~~~'.format(job.name, e))
+            worker, job.failed = None, True
+
+        if worker is None:
+            self._done(job.name)
+        else:
+            #Connected before it starts, so a worker that's done straight away is still heard
+            worker.signals.error.connect(lambda *args: self._failed.emit(job.name))
+            worker.signals.finished.connect(lambda: self._finished.emit(job.name))
+            self.pool.start(worker)
+
+
+    def fail(self, name):
+        #Marks the job's current run as failed, so it backs off
+        self.jobs[name].failed = True
+
+
+    def _done(self, name):
+        job = self.jobs[name]
+        job.running = False
+        job.latency = self._ewma(job.latency, time.monotonic() - job.started)
+
+        if job.failed:
+            job.errors += 1
+            job.failures += 1
+        else:
+            job.errors = 0
+
+        #Never closer together than the runs take, then backed off for errors and quiet hours
+        interval = max(job.target, job.latency * self.headroom) * 2 ** job.errors
+        if self.quiet():
+            interval *= self.idle
+        job.interval = min(interval, max(job.most, job.target))
+
+        wait = 0 if job.overdue else job.started + job.interval - time.monotonic()
+        job.timer.start(max(0, int(wait * 1000)))
+
+
+    def stats(self):
+        '''
+        How each job is keeping up with its target
+
+        Args:
+            None
+
+        Returns:
+            (dict): {Name : {'Target', 'Interval', 'Cadence', 'Latency' (seconds),
+                'Runs', 'Coalesced', 'Errors'}}
+        '''
+        return {
+            job.name : {
+                'Target' : job.target,
+                'Interval' : job.interval,
+                'Cadence' : job.cadence,
+                'Latency' : job.latency,
+                'Runs' : job.runs,
+                'Coalesced' : job.coalesced,
+                'Errors' : job.failures
+            } for job in self.jobs.values()
+        }
+
+
+    def log(self):
+        for name, stat in self.stats().items():
+            logging.info('---- {} Every {:.1f}s (Target {:.1f}s, Latency {:.2f}s), {} Runs, {} Coalesced, {} Errors ----'.format(
+                name, stat['Cadence'] or 0, stat['Target'], stat['Latency'] or 0,
+                stat['Runs'], stat['Coalesced'], stat['Errors']))
+
+
+class TimeAxis(pg.AxisItem):
+    #Time of day axis for the equity graph, x values being epoch seconds
+    def __init__(self, tz = None, *args, **kwargs):
+        pg.AxisItem.__init__(self, *args, **kwargs)
+        self.tz = tz
+
+    def tickStrings(self, values, scale, spacing):
+        #Only called for the ticks in view
+        return [datetime.datetime.fromtimestamp(val, self.tz).strftime('%H:%M:%S') for val in values]
 
 
 def cleanComp(s):
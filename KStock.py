@@ -17,11 +17,18 @@ from PyQt5.QtWidgets import QMenu, QTableWidget
 from PyQt5 import uic, QtCore, QtGui
 from ObjList import ObjListTableModel, ObjListTable
 from Robinhood import Robinhood, exceptions
-from resources.rHood import robinTick, robinTicks
-from resources.Markets import fetchMarkets
+from resources.rHood import robinTick, robinTicks, Fundamentals, fetchSnapshot
+from resources.Markets import MarketFeed
+from resources.Instruments import InstrumentCache
+from resources.aHood import MarketClient
+from resources.Orders import OrderTracker
+from resources.Bars import BarStore
+from resources.Tape import TapeRecorder
+from resources.Metrics import span, enableMetrics, disableMetrics
 from Helpers import *
 import pyqtgraph as pg
-from Tick import Tick
+from Tick import Tick, PriceStack, STACK_CAPACITY
+from TickList import TickList
 from Worker import *
 import pandas as pd
 
@@ -36,9 +43,9 @@ class MainWindow(base, form):
         self.setupUi(self)
 
         #Lists that house whats on the Queue, Holdings and Middle-Man
-        self.qTicks, self.hTicks, self.midTicks = [], [], []
-        #Graph Data
-        self.graphData = [[], []]
+        self.qTicks, self.hTicks, self.midTicks = TickList(), TickList(), TickList()
+        #Graph Data, (epoch ms, equity) bounded to a days worth
+        self.graphData = PriceStack()
         #Models for Queue and Holdings
         self.qModel, self.hModel = None, None
         #Spy indicator, G or R
@@ -47,6 +54,21 @@ class MainWindow(base, form):
         self._dtCost = 0
         #Initial warning for nearing your threshold
         self.notYetWarned = True
+        #How many prices each Tick holds on to, can be set in the config file
+        self.stackCap = STACK_CAPACITY
+        #Async market data client, only used if turned on in the config file
+        self.market = None
+        #Market bar data, fetched in a worker each time the Market job runs
+        self.marketFeed = MarketFeed()
+        #Runs the update cycles, made once logged in
+        self.scheduler = None
+        #Records quotes, account and orders to disk, only if turned on in the config file
+        self.tape = None
+        #Times each stage of the update cycle, only if turned on in the config file
+        self.metrics = None
+        #Latest account info, filled in by _applySnapshot
+        self.portfolio, self.account = None, None
+        self._snapshotBusy = False
 
         #Sets the eastern timezone and loads holidays
         self.tz = pytz.timezone('US/Eastern')
@@ -75,9 +97,13 @@ class MainWindow(base, form):
         self.holding.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.holding.customContextMenuRequested.connect(self.holdingContext)
 
-        #Graph options
+        #Graph options, one curve that's updated in place, peak downsampled and clipped
+        #to what's in view. The time axis only labels the ticks that are visible
         self.ePen = pg.mkPen(color='b', width=2)
-        self.graph.hideAxis('bottom')
+        self.graph.setAxisItems({'bottom': TimeAxis(self.tz, orientation='bottom')})
+        self.graph.setDownsampling(auto=True, mode='peak')
+        self.graph.setClipToView(True)
+        self.curve = self.graph.plot(pen=self.ePen)
 
         #Sets up the Robinhood API from the config file if it exists and is correct
         if os.path.isfile('core.cfg'):
@@ -97,10 +123,8 @@ class MainWindow(base, form):
                         self.startup(data)
                         self.update()
 
-                        #Starts background threads
-                        timer = TimeThread(parent=self)
-                        timer.update.connect(self.update)
-                        timer.start()
+                        #Starts background cycles
+                        self.schedule()
 
                     except (requests.exceptions.HTTPError,
                             exceptions.LoginFailed):
@@ -110,7 +134,7 @@ class MainWindow(base, form):
                 except json.decoder.JSONDecodeError as e:
                     logging.error(str(e))
                     self.warn('Corrupt')
-                    self.rUser, self.rPass, self.qTicks = [], [], []
+                    self.rUser, self.rPass, self.qTicks = [], [], TickList()
                     self.trader = None
         else:
             self.warn('No CFG')
@@ -177,11 +201,31 @@ class MainWindow(base, form):
         #Sets the budget initial value
         self.budgetHandler(self.budgetBox.value())
 
+        self.stackCap = data.get('Capacity', STACK_CAPACITY)
+
+        #Fundamentals barely move intraday, so they're cached and fetched in batches
+        self.funds = Fundamentals(self.trader)
+        #Same for instruments, which are also kept on disk between restarts
+        self.instruments = InstrumentCache(self.trader)
+        #Watches the orders of everything in the middle-man list
+        self.orders = OrderTracker(self.trader)
+        #Intraday bars the ticks warm up from, kept on disk between restarts
+        self.bars = BarStore(data.get('Bars', 'bars.h5'))
+
+        if data.get('Tape') and not self.tape:
+            self.tape = TapeRecorder()
+
+        if data.get('Metrics') and not self.metrics:
+            self.metrics = enableMetrics()
+
+        if data.get('Async') and not self.market:
+            self.market = MarketClient(self.trader.headers['Authorization'])
+
         #Initialization time of KStock
         self.startTime = datetime.datetime.now(self.tz).time()
 
         #Sets the market bar data labels
-        self.marketBar(fetchMarkets())
+        self.marketBar(*self.marketFeed.latest())
 
         #Gathers all current Robinhood holdings, this is mostly for if the program crashes
         #mid-day so it can pick back up where it left off
@@ -189,11 +233,11 @@ class MainWindow(base, form):
         if positions:
             logging.info('Previous Items in Robinhood Found, Adding Them')
             for pos in positions:
-                inst = self.trader.instrument(pos['instrument'].split('/')[-2])
+                inst = self.instruments.byId(pos['instrument'].split('/')[-2])
                 if float(pos['quantity']) > 0:
-                    if inst['symbol'] not in [tick.T for tick in self.hTicks]:
+                    if inst['symbol'] not in self.hTicks:
                         ticker = Tick(inst['symbol'], self.purPrice.value(),
-                                      self.trader, self.spy)
+                                      self.trader, self.spy, capacity=self.stackCap)
                         ticker.tradeable = False
                         buyPrice = float(pos['average_buy_price'])
                         if buyPrice > 1:
@@ -213,10 +257,16 @@ class MainWindow(base, form):
                                                 float(ticker.Q * ticker.AP)))
 
         for tick in set(data['Queue']):
-            if tick not in [ticker.T for ticker in self.hTicks]:
+            if tick not in self.hTicks:
                 self.qTicks.append(
-                    Tick(tick, self.purPrice.value(), self.trader, self.spy))
-        self.qModel.layoutChanged.emit()
+                    Tick(tick, self.purPrice.value(), self.trader, self.spy,
+                         capacity=self.stackCap))
+        self.qModel.refresh()
+        self.instruments.save()
+
+        #Fills the instrument cache for the whole company list in the background
+        self.pool.start(
+            Worker(self.instruments.prefetch, list(self.comps['Symbol'].values)))
 
     def warn(self, warn):
         '''
@@ -276,6 +326,7 @@ class MainWindow(base, form):
                 if not self.qModel:
                     self.startup(data)
                 self.update()
+                self.schedule()
             except requests.exceptions.HTTPError:
                 logging.error('Unsuccessful Login For Robinhood')
                 self.warn('Login Fail')
@@ -307,12 +358,13 @@ class MainWindow(base, form):
 
         return False
 
-    def marketBar(self, data):
+    def marketBar(self, data, age=None):
         '''
         Sets the market bar labels accordingly and colors them
 
         Args:
             data (dict): Dow, Nasdaq and S&P market data
+            age (float): seconds since the data was fetched, None if it hasn't been
 
         Returns:
             None
@@ -323,10 +375,13 @@ class MainWindow(base, form):
             'S&P': (self.spQuote, self.spChange)
         }
 
+        tip = 'Not yet fetched' if age is None else 'Updated %ds ago' % age
+
         for item in labels:
             for i in range(len(labels[item])):
                 dType = 'Quote' if i == 0 else 'Change'
                 labels[item][i].setText(data[item][dType])
+                labels[item][i].setToolTip(tip)
                 if data[item]['D']:
                     if data[item]['D'] == 'R':
                         style = 'background-color: rgb(166, 0, 0);'
@@ -402,7 +457,6 @@ class MainWindow(base, form):
             if action == delX:
                 #Removes row from table
                 logging.info('Removed {} From Queue'.format(rowTick.T))
-                self.qModel.removeRow(self.qTicks.index(rowTick))
                 self.qTicks.remove(rowTick)
 
             if action == buyX:
@@ -509,15 +563,18 @@ class MainWindow(base, form):
                         time_in_force='GFD',
                         price=ticker.C,
                         quantity=ticker.PQ).json()
+                    if self.tape:
+                        self.tape.order(ticker.T, 'Buy', ticker.PQ, ticker.C,
+                                        resp['state'])
 
                     if resp['state'] in ['unconfirmed', 'queued']:
                         logging.info(
                             '---- {} Added to MiddleMan, Waiting for Buy Confirmation ----'.
                             format(ticker.T))
                         ticker.transID = (resp['side'], resp['id'])
-                        self.midTicks.append(ticker)
+                        self.qTicks.moveTo(ticker, self.midTicks)
+                        self.orders.track(ticker)
                         self.transTable.bought(ticker)
-                        self.qTicks.remove(ticker)
                         #self.qModel.layoutChanged.emit()
                     elif resp['state'] in ['partially_filled', 'filled']:
                         self.purchase(ticker)
@@ -538,14 +595,17 @@ class MainWindow(base, form):
                     time_in_force='GFD',
                     price=ticker.C,
                     quantity=ticker.Q).json()
+                if self.tape:
+                    self.tape.order(ticker.T, 'Sell', ticker.Q, ticker.C,
+                                    resp['state'])
                 if resp['state'] in ['unconfirmed', 'queued']:
                     logging.info(
                         '---- {} Added to MiddleMan, Waiting for Sale Confirmation ----'.
                         format(ticker.T))
                     ticker.transID = (resp['side'], resp['id'])
-                    self.midTicks.append(ticker)
+                    self.hTicks.moveTo(ticker, self.midTicks)
+                    self.orders.track(ticker)
                     self.transTable.sold(ticker)
-                    self.hTicks.remove(ticker)
                     #self.hModel.layoutChanged.emit()
                 elif resp['state'] in [
                         'partially_filled', 'filled', 'confirmed'
@@ -572,10 +632,7 @@ class MainWindow(base, form):
             None
         '''
         ticker.revert()
-        if ticker.T in [tick.T for tick in fromList]:
-            fromList.remove(ticker)
-        if ticker.T not in [tick.T for tick in toList]:
-            toList.append(ticker)
+        fromList.moveTo(ticker, toList)
 
     def purchase(self, ticker, fromMidPrice=None):
         '''
@@ -589,14 +646,12 @@ class MainWindow(base, form):
         '''
         try:
             #Puts the tick in holdings, if executed immediately remove it from Queue and puts it in Transactions
-            self.hTicks.append(ticker)
-
             if fromMidPrice:
-                self.midTicks.remove(ticker)
+                self.midTicks.moveTo(ticker, self.hTicks)
                 tPrice = fromMidPrice
             else:
                 tPrice = ticker.AP
-                self.qTicks.remove(ticker)
+                self.qTicks.moveTo(ticker, self.hTicks)
                 self.transTable.bought(ticker)
 
             self._dtCost += float(ticker.Q * tPrice)
@@ -607,6 +662,8 @@ class MainWindow(base, form):
             logging.info(
                 '---- Bought {} shares of {} at {}, SL: {} ----'.format(
                     ticker.Q, ticker.T, tPrice, ticker.SL))
+            if self.tape:
+                self.tape.order(ticker.T, 'Bought', ticker.Q, tPrice, 'filled')
 
             return True
 
@@ -629,13 +686,15 @@ class MainWindow(base, form):
         '''
         if fromMidPrice:
             tPrice = fromMidPrice
-            self.midTicks.remove(ticker)
+            fromList = self.midTicks
         else:
             tPrice = ticker.C
-            self.hTicks.remove(ticker)
+            fromList = self.hTicks
 
         logging.info('---- Sold {} shares of {} at {} ----'.format(
             ticker.Q, ticker.T, tPrice))
+        if self.tape:
+            self.tape.order(ticker.T, 'Sold', ticker.Q, tPrice, 'filled')
 
         #Updates profit and costs
         indprofit = float(ticker.Q * tPrice) - float(ticker.Q * ticker.AP)
@@ -649,8 +708,10 @@ class MainWindow(base, form):
 
         #If rebuying puts the old tick back on the Queue
         if self.rebuy.isChecked():
-            self.qTicks.append(ticker)
-            self.qModel.layoutChanged.emit()
+            fromList.moveTo(ticker, self.qTicks)
+            self.qModel.refresh(())
+        else:
+            fromList.remove(ticker)
 
         self.transTable.sold(ticker)
 
@@ -658,172 +719,106 @@ class MainWindow(base, form):
 
         return True
 
-    def update(self):
+    def _applyDecisions(self, decisions):
         '''
-        The main function that gets called every X contains all the child
-        table updating functions
+        Carries out what a Hold, Queue or Middle worker decided, runs on the GUI
+        thread. Ticks that have moved on since the snapshot are skipped, and buys
+        are checked against the budget again, counting the ones before them. The
+        workers only decide, positions are opened and closed here
 
         Args:
-            None
+            decisions (list): [(action, Tick, price)], 'Buy' with the transaction
+                price from the Queue, 'Sell' from the Holdings, or 'Bought'/'Sold'
+                with the fill price of a middle-man order
 
         Returns:
             None
         '''
+        #What's been bought in this batch, the labels don't show it until the next snapshot
+        spent, dtCost = 0, self._dtCost
+        for action, tick, price in decisions:
+            if action in ('Bought', 'Sold'):
+                if tick not in self.midTicks:
+                    continue
+                if action == 'Sold':
+                    logging.info(
+                        '---- {} Moved from Mid to Queue ----'.format(tick.T))
+                    self.sell(tick, fromMidPrice=price)
+                else:
+                    self.purchase(tick, fromMidPrice=price)
+
+            elif action == 'Buy':
+                #Removed or bought some other way since the snapshot
+                if tick not in self.qTicks:
+                    continue
+                cash = float(self.cash.text()) - spent
+                if dtCost + spent + price < self.budget and price < float(
+                        self.buyingPower.text()) - spent and price < cash:
+                    spent += price
+                    tick.open()
+                    self._executeOrder(tick, orderType='Buy', transPrice=price)
+                else:
+                    logging.info('---- {} Over Budget, Not Bought ----'.format(tick.T))
 
-        def _success(worker):
-            #Called when one of the workers is successfully completed
-            return
-
-        def _error(worker):
-            #Called if there was an error
-            logging.error('~~~~ Error with the {} ~~~~'.format(worker))
-
-        def _midCheck():
-            '''
-            Monitors the middle man list for unfilled orders
-
-            Args:
-                None
-
-            Returns:
-                None
-            '''
-            headers = {
-                'Accept': 'application/json',
-                'Authorization': self.trader.headers['Authorization']
-            }
-
-            for tick in self.midTicks:
-                if tick.transID:
-                    try:
-                        url = 'https://api.robinhood.com/orders' + '/' + tick.transID[1]
-                        res = requests.get(url, headers=headers).json()
-                        if tick.transID[0] == 'sell':
-                            if res['state'] in [
-                                    'partially_filled', 'filled', 'confirmed'
-                            ]:
-                                logging.info(
-                                    '---- {} Moved from Mid to Queue ----'.
-                                    format(tick.T))
-                                self.sell(
-                                    tick, fromMidPrice=float(res['price']))
-                        else:
-                            if res['state'] in ['partially_filled', 'filled']:
-                                self.purchase(
-                                    tick, fromMidPrice=float(res['price']))
-                    except Exception as e:
-                        logging.error('~~~~ Mid Check Error: {} ~~~~'.format(e))
-
-        def _tickUpdate(curList):
-            '''
-            Updates the tick objects in the respective list
+            elif tick in self.hTicks:
+                self._executeOrder(tick, 'Sell')
 
-            Args:
-                curList (str): string name of list that is being updated
+        if decisions:
+            changed = [tick for _, tick, _ in decisions]
+            with span('applyDecisions.refresh'):
+                self.hModel.refresh(changed)
+                self.qModel.refresh(changed)
 
-            Returns:
-                None
-            '''
-            listDict = {'Hold': self.hTicks, 'Queue': self.qTicks}
-            tickData = robinTicks(self.trader,
-                                  [tick.T for tick in listDict[curList]],
-                                  self.afterHours())
-            if len(tickData) != len(listDict[curList]):
-                logging.error(
-                    '~~~~ {} and Fetch Lengths Do Not Match ~~~~'.format(
-                        curList))
-                return
-            else:
-                for tickDict in tickData:
-                    try:
-                        idx = [tick.T for tick in listDict[curList]].index(
-                            tickDict['Sym'])
-                    except ValueError:
-                        return
-                    listDict[curList][idx].update(
-                        data=tickDict['Data'],
-                        purPrice=self.purPrice.value(),
-                        spy=self.spy)
-
-        def _queueCall():
-            '''
-            Performs all the necessaries for the Queue table, is put in a worker
-            and executes in the background
+    def schedule(self):
+        '''
+        Starts the update cycles, holdings are checked the most often since they
+        carry the stop losses
 
-            Args:
-                None
+        Args:
+            None
 
-            Returns:
-                None
-            '''
-            if len(self.qTicks):
-                _tickUpdate('Queue')
+        Returns:
+            None
+        '''
+        if self.scheduler:
+            return
+        self.scheduler = Scheduler(
+            self.pool, quiet=lambda: self.afterHours(), parent=self)
+        self.scheduler.add('Hold', lambda: self.update('Hold'), 2, most=30)
+        self.scheduler.add('Middle', lambda: self.update('Middle'), 3, most=30)
+        self.scheduler.add('Queue', lambda: self.update('Queue'), 5)
+        self.scheduler.add('Account', lambda: self.update('Account'), 5)
+        #Fetched in a worker so a failed fetch backs the job off
+        self.scheduler.add(
+            'Market', lambda: Worker(self.marketFeed.fetch), 30, most=300)
+
+    def _snapshotDone(self):
+        self._snapshotBusy = False
+
+    def _applySnapshot(self, snap):
+        '''
+        Shows a fetched account snapshot, runs on the GUI thread once the
+        snapshot worker is done
 
-            #If actually trading, iterate through Queue and if the projected cost doesn't exceed budget see if
-            #it meets purchasing criteria, else just update
-            if not self.startBut.isEnabled():
-                for tick in self.qTicks:
-                    logging.info('Queue {}'.format(tick.T))
-                    transPrice = tick.C * tick.PQ
-                    try:
-                        if self._dtCost + transPrice < self.budget and transPrice < float(
-                                self.buyingPower.text()
-                        ) and transPrice < float(self.cash.text()):
-                            if tick.toBuy(
-                                    purPrice=self.purPrice.value(),
-                                    spy=self.spy):
-                                self._executeOrder(
-                                    tick,
-                                    orderType='Buy',
-                                    transPrice=transPrice)
-                    except TypeError:
-                        pass
-
-        def _holdCall():
-            '''
-            Performs all the necessaries for the Holdings table, is put in a worker
-            and executes in the background
+        Args:
+            snap (Snapshot): portfolio, account and market data from fetchSnapshot
 
-            Args:
-                None
+        Returns:
+            None
+        '''
+        if snap.error is not None:
+            logging.error('~~~~ Connection Error: {} ~~~~'.format(snap.error))
+            if self.scheduler:
+                self.scheduler.fail('Account')
+            return
 
-            Returns:
-                None
-            '''
-            if len(self.hTicks):
-                _tickUpdate('Hold')
+        if self.tape:
+            self.tape.account(snap)
 
-            if not self.startBut.isEnabled():
-                for tick in self.hTicks:
-                    if tick.tradeable:
-                        logging.info('Hold {}'.format(tick.T))
-                        if tick.toSell(
-                                purPrice=self.purPrice.value(), spy=self.spy):
-                            self._executeOrder(tick, 'Sell')
-
-        #Robinhood portfolio and account info, creates an empty one if an error is thrown
-        #such as having 0 in the portfolio
-        try:
-            self.portfolio = self.trader.portfolios()
-            self.account = self.trader.get_account()['margin_balances']
-        except IndexError:
-            logging.error('~~~~ Portfolio Empty ~~~~')
-            self.portfolio = {
-                'equity': 0,
-                'extended_hours_equity': 0,
-            }
-            self.account = {
-                'unsettled_funds': 0,
-                'start_of_day_dtbp': 0,
-                'unallocated_margin_cash': 0
-            }
-        except (requests.exceptions.ConnectionError,
-                requests.exceptions.HTTPError, TimeoutError) as e:
-            logging.error('~~~~ Connection Error: {} ~~~~'.format(e))
-            return
+        self.portfolio, self.account = snap.portfolio, snap.account
 
-        #Updates the market tracker bar
-        self.marketBar(fetchMarkets())
+        #Updates the market tracker bar with whatever the feed last got
+        self.marketBar(snap.markets, snap.age)
 
         now = datetime.datetime.now(self.tz).time()
 
@@ -843,18 +838,11 @@ class MainWindow(base, form):
             if self.portfolio['equity']:
 
                 #Plt that stuff if it's during the trading day
-                self.graphData[0].append(now.strftime('%H:%M:%S'))
-                self.graphData[1].append(float(self.portfolio['equity']))
-
-                xdict = dict(enumerate(self.graphData[0]))
-                ax = self.graph.getAxis('bottom')
-                ax.setTicks([xdict.items()])
-
-                self.graph.plot(
-                    list(xdict.keys()),
-                    self.graphData[1],
-                    pen=self.ePen,
-                    clear=False)
+                with span('applySnapshot.graph'):
+                    self.graphData.append(
+                        int(time.time() * 1000), float(self.portfolio['equity']))
+                    self.curve.setData(self.graphData.times() / 1000,
+                                       self.graphData.prices())
 
         self.buyingPower.setText('%.2f' %
                                  (float(self.account['start_of_day_dtbp'])))
@@ -891,31 +879,210 @@ class MainWindow(base, form):
                             hour=15, minute=58, second=0, tzinfo=self.tz):
                         self.dump()
 
-        if len(self.hTicks) > 0:
-            holdWorker = Worker(_holdCall)
-            holdWorker.signals.finished.connect(lambda: _success('Hold'))
-            holdWorker.signals.error.connect(lambda: _error('Hold'))
+    def update(self, part=None):
+        '''
+        The main function that gets called every X contains all the child
+        table updating functions
+
+        Args:
+            part (str): only runs one of the Account, Hold, Queue or Middle
+                cycles, all of them if None
+
+        Returns:
+            (Worker): the worker for the part, left for the caller to start, None if
+                there wasn't one. Without a part the workers are started here
+        '''
 
-            self.pool.start(holdWorker)
-            self.hModel.layoutChanged.emit()
-            self.holding.viewport().update()
+        def _success(worker, ticks):
+            #Called when one of the workers is successfully completed, its ticks may have
+            #changed or moved between tables so both are refreshed for them
+            self.hModel.refresh(ticks)
+            self.qModel.refresh(ticks)
 
-        #Only calls the update function if there's stuff in the table, saves memory
-        if len(self.qTicks) > 0:
-            queueWorker = Worker(_queueCall)
-            queueWorker.signals.finished.connect(lambda: _success('Queue'))
-            queueWorker.signals.error.connect(lambda: _error('Queue'))
+        def _error(worker):
+            #Called if there was an error
+            logging.error('~~~~ Error with the {} ~~~~'.format(worker))
+
+        def _timed(stage, call, *args):
+            #Runs one of the worker calls as a stage of the cycle
+            with span(stage):
+                return call(*args)
 
-            self.pool.start(queueWorker)
-            self.qModel.layoutChanged.emit()
-            self.queue.viewport().update()
+        def _midCheck(ticks):
+            '''
+            Monitors the middle man list for unfilled orders
+
+            Args:
+                ticks (tuple): snapshot of the middle-man ticks
 
-        if len(self.midTicks) > 0:
-            midWorker = Worker(_midCheck)
-            midWorker.signals.finished.connect(lambda: _success('Middle'))
-            midWorker.signals.error.connect(lambda: _error('Middle'))
+            Returns:
+                (list): [('Bought'/'Sold', Tick, fill price)] for _applyDecisions
+            '''
+            try:
+                with span('midCheck.poll'):
+                    fills = self.orders.poll()
+            except Exception as e:
+                logging.error('~~~~ Mid Check Error: {} ~~~~'.format(e))
+                return []
+
+            return [('Sold' if side == 'sell' else 'Bought', tick, price)
+                    for tick, side, price in fills]
+
+        def _tickUpdate(ticks, settings):
+            '''
+            Updates the tick objects in the snapshot
+
+            Args:
+                ticks (tuple): snapshot of the ticks being updated
+                settings (dict): settings read off the GUI when the snapshot was taken
+
+            Returns:
+                None
+            '''
+            bySym = {tick.T: tick for tick in ticks}
+            with span('tickUpdate.fetch'):
+                if self.market:
+                    tickData = self.market.robinTicks(list(bySym), settings['AH'])
+                else:
+                    tickData = robinTicks(self.trader, list(bySym), settings['AH'],
+                                          self.funds)
+            if len(tickData) != len(ticks):
+                logging.error('~~~~ Snapshot and Fetch Lengths Do Not Match ~~~~')
+                return
+            else:
+                #Only whole batches of the snapshot's symbols go on the tape
+                if self.tape and all(tickDict['Sym'] in bySym for tickDict in tickData):
+                    self.tape.quotes(tickData)
+                with span('tickUpdate.ticks'):
+                    for tickDict in tickData:
+                        tick = bySym.get(tickDict['Sym'])
+                        if tick is None:
+                            return
+                        tick.update(
+                            data=tickDict['Data'],
+                            purPrice=settings['PurPrice'],
+                            spy=settings['Spy'],
+                            bars=self.bars)
+
+        def _queueCall(ticks, settings):
+            '''
+            Performs all the necessaries for the Queue table, is put in a worker
+            and executes in the background over a snapshot of the Queue
+
+            Args:
+                ticks (tuple): snapshot of the Queue
+                settings (dict): settings read off the GUI when the snapshot was taken
+
+            Returns:
+                (list): [('Buy', Tick, transaction price)] for _applyDecisions
+            '''
+            with span('queueCall.tickUpdate'):
+                _tickUpdate(ticks, settings)
+
+            #If actually trading, iterate through Queue and if the projected cost doesn't exceed budget see if
+            #it meets purchasing criteria, else just update. The budget is checked again
+            #when the buys are applied
+            decisions = []
+            if settings['Trading']:
+                with span('queueCall.toBuy'):
+                    for tick in ticks:
+                        logging.info('Queue {}'.format(tick.T))
+                        transPrice = tick.C * tick.PQ
+                        try:
+                            if settings['DTCost'] + transPrice < settings['Budget'] \
+                                    and transPrice < settings['BuyingPower'] \
+                                    and transPrice < settings['Cash']:
+                                #Only decides, the position's opened by _applyDecisions
+                                if tick.toBuy(
+                                        purPrice=settings['PurPrice'],
+                                        spy=settings['Spy'],
+                                        opening=False):
+                                    decisions.append(('Buy', tick, transPrice))
+                        except TypeError:
+                            pass
+
+            return decisions
+
+        def _holdCall(ticks, settings):
+            '''
+            Performs all the necessaries for the Holdings table, is put in a worker
+            and executes in the background over a snapshot of the Holdings
+
+            Args:
+                ticks (tuple): snapshot of the Holdings
+                settings (dict): settings read off the GUI when the snapshot was taken
+
+            Returns:
+                (list): [('Sell', Tick, 0)] for _applyDecisions
+            '''
+            with span('holdCall.tickUpdate'):
+                _tickUpdate(ticks, settings)
+
+            decisions = []
+            if settings['Trading']:
+                with span('holdCall.toSell'):
+                    for tick in ticks:
+                        if tick.tradeable:
+                            logging.info('Hold {}'.format(tick.T))
+                            if tick.toSell(
+                                    purPrice=settings['PurPrice'],
+                                    spy=settings['Spy']):
+                                decisions.append(('Sell', tick, 0))
+
+            return decisions
+
+        #Everything update does on the GUI thread, the workers time themselves
+        with span('update'):
+            #Portfolio and account info are fetched in the background, and applied by
+            #_applySnapshot once they're in. Only one fetch is out at a time
+            workers = []
+            if part in (None, 'Account') and not self._snapshotBusy:
+                self._snapshotBusy = True
+                snapWorker = Worker(fetchSnapshot, self.trader, self.marketFeed)
+                snapWorker.signals.result.connect(self._applySnapshot)
+                snapWorker.signals.error.connect(lambda err: _error('Snapshot'))
+                snapWorker.signals.finished.connect(self._snapshotDone)
+                workers.append(snapWorker)
+
+            #Only picks up rows added or removed since the last cycle, the cells are
+            #refreshed for each worker's ticks as it finishes
+            with span('update.refresh'):
+                self.hModel.refresh(())
+                self.qModel.refresh(())
+
+            #The workers get their own copy of the lists and of the settings, the lists
+            #are only changed here on the GUI thread when their decisions are applied
+            settings = {
+                'PurPrice': self.purPrice.value(),
+                'Spy': self.spy,
+                'Trading': not self.startBut.isEnabled(),
+                'AH': self.afterHours(),
+                'DTCost': self._dtCost,
+                'Budget': self.budget,
+                'BuyingPower': float(self.buyingPower.text()),
+                'Cash': float(self.cash.text())
+            }
 
-            self.pool.start(midWorker)
+            calls = [('Hold', 'holdCall', _holdCall, self.hTicks),
+                     ('Queue', 'queueCall', _queueCall, self.qTicks),
+                     ('Middle', 'midCheck', _midCheck, self.midTicks)]
+
+            for name, stage, call, ticks in calls:
+                #Only calls the update function if there's stuff in the table, saves memory
+                if part in (None, name) and len(ticks) > 0:
+                    args = (tuple(ticks), ) if name == 'Middle' else (tuple(ticks), settings)
+                    worker = Worker(_timed, stage, call, *args)
+                    worker.signals.result.connect(self._applyDecisions)
+                    worker.signals.finished.connect(
+                        lambda name=name, ticks=args[0]: _success(name, ticks))
+                    worker.signals.error.connect(lambda err, name=name: _error(name))
+                    workers.append(worker)
+
+        #A part's worker is started by the Scheduler, once it's connected to it
+        if part:
+            return workers[0] if workers else None
+        for worker in workers:
+            self.pool.start(worker)
 
     def addQueue(self, ticks=False):
         '''
@@ -939,11 +1106,11 @@ class MainWindow(base, form):
             Returns:
                 None
             '''
-            if ticker not in [tick.T for tick in self.qTicks + self.hTicks]:
-                inst = self.trader.instruments(ticker)[0]
+            if ticker not in self.qTicks and ticker not in self.hTicks:
+                inst = self.instruments.bySymbol(ticker)
 
                 #Whether it's actually tradeable on RH
-                if not inst['tradeable']: return
+                if not inst or not inst['tradeable']: return
 
                 #Whether it's a high volatilty stock (RH has some rules against this)
                 sig = float(inst['maintenance_ratio'])
@@ -956,8 +1123,9 @@ class MainWindow(base, form):
                     if addWarn == QMessageBox.No: return
 
                 self.qTicks.append(
-                    Tick(ticker, self.purPrice.value(), self.trader, self.spy))
-                self.qModel.layoutChanged.emit()
+                    Tick(ticker, self.purPrice.value(), self.trader, self.spy,
+                         capacity=self.stackCap))
+                self.qModel.refresh(())
                 logging.info('Added ' + ticker + ' to Queue')
 
         if not ticks:
@@ -994,7 +1162,11 @@ class MainWindow(base, form):
                         'User': self.rUser,
                         'Password': self.rPass
                     },
-                    'Queue': [tick.T for tick in self.qTicks if self.qTicks]
+                    'Queue': self.qTicks.symbols(),
+                    'Capacity': self.stackCap,
+                    'Async': self.market is not None,
+                    'Tape': self.tape is not None,
+                    'Metrics': self.metrics is not None
                 }
 
                 json.dump(data, fileOut)
@@ -1012,6 +1184,17 @@ class MainWindow(base, form):
         logging.info('Closing and Resubmitting Config File')
         try:
             self.autosave(True)
+            self.instruments.save()
+            self.bars.close()
+            if self.tape:
+                self.tape.close()
+            if self.metrics:
+                disableMetrics()
+            if self.market:
+                self.market.close()
+            if self.scheduler:
+                self.scheduler.stop()
+                self.scheduler.log()
         except AttributeError:
             pass
 
@@ -1,9 +1,11 @@
 import copy
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
 from PyQt5 import QtGui
-from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QT_VERSION_STR
-from PyQt5.QtWidgets import QTableView, QMenu, QInputDialog, QErrorMessage, QDialog, QDialogButtonBox, QVBoxLayout,\
-     QTableWidget, QTableWidgetItem
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, QT_VERSION_STR, QThread, pyqtSignal
+from PyQt5.QtWidgets import QTableView, QMenu, QInputDialog, QErrorMessage, QDialog, QDialogButtonBox, QVBoxLayout
 from table.CheckBoxDelegateQt import CheckBoxDelegateQt
 from table.FloatEditDelegateQt import FloatEditDelegateQt
 from table.DateTimeEditDelegateQt import DateTimeEditDelegateQt
@@ -23,26 +25,39 @@ def color(move):
         return QtGui.QColor(144, 144, 144)
 
 
+_brushes = {}
+
+def brush(move):
+    #Same as color(), but the brush is made once per direction and reused
+    b = _brushes.get(move)
+    if b is None:
+        b = _brushes[move] = QtGui.QBrush(color(move))
+    return b
+
+
+# Compiled accessor for an attribute path, attrgetter already follows "a.b" paths.
+attrGetter = lru_cache(maxsize = None)(attrgetter)
+
+
 def getAttrRecursive(obj, attr):
     """ Recursive introspection (i.e. get the member 'b' of a member 'a' by name as 'a.b').
     """
-    try:
-        p = attr.index(".")
-        obj = getattr(obj, attr[0:p])
-        return getAttrRecursive(obj, attr[p+1:])
-    except ValueError:
-        return getattr(obj, attr)
+    return attrGetter(attr)(obj)
+
+
+def sameValue(a, b):
+    """ Equality that also treats NaN as equal to NaN.
+    """
+    return a is b or a == b or (a != a and b != b)
 
 
 def setAttrRecursive(obj, attr, value):
     """ Recursive introspection (i.e. set the member 'b' of a member 'a' by name as 'a.b').
     """
-    try:
-        p = attr.index(".")
-        obj = getattr(obj, attr[0:p])
-        setAttrRecursive(obj, attr[p+1:], value)
-    except ValueError:
-        setattr(obj, attr, value)
+    path, _, attr = attr.rpartition(".")
+    if path:
+        obj = attrGetter(path)(obj)
+    setattr(obj, attr, value)
 
 
 class ObjListTableModel(QAbstractTableModel):
@@ -83,14 +98,198 @@ class ObjListTableModel(QAbstractTableModel):
     :param isRowObjects (bool): If True, objects are rows and properties are columns, otherwise vice-versa.
     :param isDynamic (bool): If True, objects can be inserted/deleted, otherwise not.
     :param templateObject (object): Object that will be deep copied to create new objects when inserting into the list.
+
+    The object list may also be changed directly (e.g. by another thread). The view only sees those changes
+    when refresh() is called, which diffs the list and the displayed values against what the view was last
+    told about and emits the minimal row insert/remove and dataChanged signals. Callers that know which
+    objects changed pass them to refresh() so only those rows are compared, and lists with a 'version'
+    counter that bumps on every insert/remove (like TickList) skip the membership check when it hasn't moved.
     """
+    _refreshRequested = pyqtSignal(object)
+
     def __init__(self, objects = None, properties = None, isRowObjects = True, isDynamic = True, templateObject = None, parent = None):
         QAbstractTableModel.__init__(self, parent)
         self.objects = objects if (objects is not None) else []
+        self._getters = []
         self.properties = properties if (properties is not None) else []
         self.isRowObjects = isRowObjects
         self.isDynamic = isDynamic
         self.templateObject = templateObject
+        # Objects as the view currently knows them, only changed on the GUI thread.
+        self._rows = list(self.objects)
+        # Last displayed values per object, keyed by id(object).
+        self._cells = {}
+        # Row of each object in _rows keyed by id(object), rebuilt when the rows change.
+        self._index = None
+        # Version of the object list the rows were last synced to.
+        self._version = None
+        self._refreshRequested.connect(self.refresh, Qt.QueuedConnection)
+
+
+    @property
+    def properties(self):
+        return self._properties
+
+
+    @properties.setter
+    def properties(self, properties):
+        # Each property's attribute path is compiled to an accessor once, rather than parsed per cell.
+        self._properties = properties
+        self._getters = [attrGetter(prop['attr']) if 'attr' in prop else None for prop in properties]
+
+
+    def _objectValues(self, obj):
+        values = []
+        for getter in self._getters:
+            try:
+                values.append(getter(obj))
+            except:
+                values.append(None)
+        # Direction drives the background colour of every cell.
+        values.append(getattr(obj, 'D', None))
+        return values
+
+
+    def _beginInsert(self, first, last):
+        if self.isRowObjects:
+            self.beginInsertRows(QModelIndex(), first, last)
+        else:
+            self.beginInsertColumns(QModelIndex(), first, last)
+
+
+    def _endInsert(self):
+        if self.isRowObjects:
+            self.endInsertRows()
+        else:
+            self.endInsertColumns()
+
+
+    def _beginRemove(self, first, last):
+        if self.isRowObjects:
+            self.beginRemoveRows(QModelIndex(), first, last)
+        else:
+            self.beginRemoveColumns(QModelIndex(), first, last)
+
+
+    def _endRemove(self):
+        if self.isRowObjects:
+            self.endRemoveRows()
+        else:
+            self.endRemoveColumns()
+
+
+    def _cellIndex(self, objectIndex, propertyIndex):
+        if self.isRowObjects:
+            return self.index(objectIndex, propertyIndex)
+        return self.index(propertyIndex, objectIndex)
+
+
+    def _syncMembership(self):
+        """ Brings the view's rows in line with the object list using row insert/remove signals.
+        """
+        current = list(self.objects)
+        currentIds = set(map(id, current))
+
+        # Removed objects, in contiguous runs from the bottom up so indices stay valid.
+        i = len(self._rows) - 1
+        while i >= 0:
+            if id(self._rows[i]) in currentIds:
+                i -= 1
+                continue
+            j = i
+            while j > 0 and id(self._rows[j - 1]) not in currentIds:
+                j -= 1
+            self._beginRemove(j, i)
+            for obj in self._rows[j:i + 1]:
+                self._cells.pop(id(obj), None)
+            del self._rows[j:i + 1]
+            self._index = None
+            self._endRemove()
+            i = j - 1
+
+        rowIds = set(map(id, self._rows))
+        if [id(obj) for obj in current if id(obj) in rowIds] != [id(obj) for obj in self._rows]:
+            # Objects were reordered, which rows can't describe.
+            self.layoutAboutToBeChanged.emit()
+            self._rows = current
+            self._index = None
+            self._cells = {id(obj): self._objectValues(obj) for obj in current}
+            self.layoutChanged.emit()
+            return
+
+        # Inserted objects, in contiguous runs from the top down.
+        k = 0
+        while k < len(current):
+            if id(current[k]) in rowIds:
+                k += 1
+                continue
+            n = k
+            while n + 1 < len(current) and id(current[n + 1]) not in rowIds:
+                n += 1
+            self._beginInsert(k, n)
+            self._rows[k:k] = current[k:n + 1]
+            self._index = None
+            for obj in current[k:n + 1]:
+                self._cells[id(obj)] = self._objectValues(obj)
+            self._endInsert()
+            k = n + 1
+
+
+    def _diff(self, obj, numProps):
+        """ Updates an object's last displayed values, returning the [firstProperty, lastProperty] that changed or None.
+        """
+        values = self._objectValues(obj)
+        old = self._cells.get(id(obj))
+        if old == values:
+            return None
+        self._cells[id(obj)] = values
+        if old is None or not sameValue(old[-1], values[-1]):
+            return [0, numProps - 1]
+        diff = [i for i in range(numProps) if not sameValue(old[i], values[i])]
+        if not diff:
+            return None
+        return [diff[0], diff[-1]]
+
+
+    def refresh(self, changed = None):
+        """ Emits the minimal signals for whatever changed since the last refresh.
+
+        Safe to call from any thread, off the GUI thread the refresh is queued to it.
+
+        :param changed (iterable): Objects whose values may have changed, only their rows are compared.
+            If None, every row is compared. Row inserts/removes are picked up either way.
+        """
+        if QThread.currentThread() != self.thread():
+            self._refreshRequested.emit(changed)
+            return
+
+        # Read before syncing, so a change made while syncing is caught by the next refresh.
+        version = getattr(self.objects, 'version', None)
+        if version is None or version != self._version:
+            self._syncMembership()
+            self._version = version
+
+        if changed is None:
+            rows = enumerate(self._rows)
+        else:
+            if self._index is None:
+                self._index = {id(obj): objectIndex for objectIndex, obj in enumerate(self._rows)}
+            rows = sorted((self._index[id(obj)], obj) for obj in changed if id(obj) in self._index)
+
+        numProps = len(self.properties)
+        runs = []  # [firstObject, lastObject, firstProperty, lastProperty]
+        for objectIndex, obj in rows:
+            props = self._diff(obj, numProps)
+            if props is None:
+                continue
+            if runs and runs[-1][1] == objectIndex - 1 and runs[-1][2:] == props:
+                runs[-1][1] = objectIndex
+            else:
+                runs.append([objectIndex, objectIndex] + props)
+
+        for first, last, firstProp, lastProp in runs:
+            if numProps:
+                self.dataChanged.emit(self._cellIndex(first, firstProp), self._cellIndex(last, lastProp))
 
 
     def getObject(self, index):
@@ -98,7 +297,7 @@ class ObjListTableModel(QAbstractTableModel):
             return None
         objectIndex = index.row() if self.isRowObjects else index.column()
         try:
-            return self.objects[objectIndex]
+            return self._rows[objectIndex]
         except IndexError:
             return None
 
@@ -114,29 +313,41 @@ class ObjListTableModel(QAbstractTableModel):
 
 
     def rowCount(self, parent = None, *args, **kwargs):
-        return len(self.objects) if self.isRowObjects else len(self.properties)
+        if (parent is not None) and parent.isValid():
+            return 0  # Table, so cells have no children.
+        return len(self._rows) if self.isRowObjects else len(self.properties)
 
 
     def columnCount(self, parent = None, *args, **kwargs):
-        return len(self.properties) if self.isRowObjects else len(self.objects)
+        if (parent is not None) and parent.isValid():
+            return 0
+        return len(self.properties) if self.isRowObjects else len(self._rows)
 
 
     def data(self, index, role = Qt.DisplayRole):
         if not index.isValid():
             return None
-        obj = self.getObject(index)
-        prop = self.getProperty(index)
+        if self.isRowObjects:
+            objectIndex, propertyIndex = index.row(), index.column()
+        else:
+            objectIndex, propertyIndex = index.column(), index.row()
+        if not (objectIndex < len(self._rows) and propertyIndex < len(self._getters)):
+            return None
+        obj = self._rows[objectIndex]
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            getter = self._getters[propertyIndex]
+            if getter is None:
+                return None
+            try:
+                value = getter(obj)
+            except:
+                return None
+            #Missing prices are NaN, which are left blank
+            return None if value != value else value
         if role == Qt.BackgroundRole:
-            return color(obj.D)
+            return brush(getattr(obj, 'D', None))
         if role == Qt.TextAlignmentRole:
             return Qt.AlignCenter
-        if (obj is None) or (prop is None):
-            return None
-        try:
-            if role in [Qt.DisplayRole, Qt.EditRole]:
-                return getAttrRecursive(obj, prop['attr'])
-        except:
-            return None
         return None
 
 
@@ -193,7 +404,7 @@ class ObjListTableModel(QAbstractTableModel):
                 return None
         else:
             # Display object indices (1-based).
-            return (section + 1) if (0 <= section < len(self.objects)) else None
+            return (section + 1) if (0 <= section < len(self._rows)) else None
 
 
     def insertObjects(self, i, num = 1):
@@ -210,6 +421,8 @@ class ObjListTableModel(QAbstractTableModel):
             elif len(self.objects):
                 copyIndex = min([max([0, objectIndex]), len(self.objects) - 1])  # Clamp objectIndex to a valid object index.
                 self.objects.insert(objectIndex, copy.deepcopy(self.objects[copyIndex]))
+        self._rows = list(self.objects)
+        self._index = None
         if self.isRowObjects:
             self.endInsertRows()
         else:
@@ -229,10 +442,14 @@ class ObjListTableModel(QAbstractTableModel):
         if self.isRowObjects:
             self.beginRemoveRows(QModelIndex(), i, i + num - 1)
             del self.objects[i:i+num]
+            self._rows = list(self.objects)
+            self._index = None
             self.endRemoveRows()
         else:
             self.beginRemoveColumns(QModelIndex(), i, i + num - 1)
             del self.objects[i:i+num]
+            self._rows = list(self.objects)
+            self._index = None
             self.endRemoveColumns()
         return True
 
@@ -256,6 +473,8 @@ class ObjListTableModel(QAbstractTableModel):
                 j = moveToIndex + i
                 j = min([max([0, j]), len(self.objects)])  # Clamp j to within [0, # of objects].
                 self.objects.insert(j, obj)
+            self._rows = list(self.objects)
+            self._index = None
             self.endResetModel()
             return True
         except:
@@ -268,6 +487,9 @@ class ObjListTableModel(QAbstractTableModel):
                 self.templateObject = self.objects[0]
             self.beginResetModel()
             del self.objects[:]
+            self._rows = []
+            self._index = None
+            self._cells = {}
             self.endResetModel()
 
 
@@ -417,52 +639,173 @@ class ObjListTable(QTableView):
             pass
 
 
-class Transactions(QTableWidget):
-    #Custom QTableWidget 
+class Ledger():
+    """ Trade ledger, one row per round trip [Tick, Qty, Purchase, Sell].
+
+    Rows are indexed by symbol, and the rows still waiting on a sale are kept per symbol in
+    the order they were bought, so matching a sale to its purchase doesn't scan the ledger.
+    """
+    COLUMNS = ('Tick', 'Qty', 'Purchase', 'Sell')
+
+    def __init__(self):
+        self.rows = []
+        # {Sym: [Rows]}, {Sym: deque of open Rows}
+        self._bySym = {}
+        self._open = {}
+
+
+    def __len__(self):
+        return len(self.rows)
+
+
+    def rowsFor(self, sym):
+        return self._bySym.get(sym, [])
+
+
+    def bought(self, sym, qty, price):
+        """ Opens a row for a purchase, returns its index.
+        """
+        row = len(self.rows)
+        self.rows.append([sym, qty, price, None])
+        self._bySym.setdefault(sym, []).append(row)
+        self._open.setdefault(sym, deque()).append(row)
+        return row
+
+
+    def openRow(self, sym):
+        """ Oldest row for the symbol still waiting on a sale, None if there isn't one.
+        """
+        openRows = self._open.get(sym)
+        return openRows[0] if openRows else None
+
+
+    def sold(self, sym, qty, buyPrice, price):
+        """ Closes the oldest open row for the symbol with the sale.
+
+        If the symbol was never bought here (e.g. held from before startup), a closed row is added.
+        If all its rows are already closed, the sale was already recorded and nothing changes.
+
+        Returns the row changed or added, None if nothing changed.
+        """
+        openRows = self._open.get(sym)
+        if openRows:
+            row = openRows.popleft()
+            self.rows[row][3] = price
+            return row
+        if sym in self._bySym:
+            return None
+        row = len(self.rows)
+        self.rows.append([sym, qty, buyPrice, price])
+        self._bySym[sym] = [row]
+        return row
+
+
+    def direction(self, row):
+        """ 'G'/'R' for a profitable/losing closed row, '' for an even or open one.
+        """
+        _, _, buyPrice, price = self.rows[row]
+        if price is None or price == buyPrice:
+            return ''
+        return 'G' if price > buyPrice else 'R'
+
+
+class LedgerModel(QAbstractTableModel):
+    """ Read only Qt model over a Ledger.
+    """
+    def __init__(self, ledger = None, parent = None):
+        QAbstractTableModel.__init__(self, parent)
+        self.ledger = ledger if (ledger is not None) else Ledger()
+
+
+    def rowCount(self, parent = None, *args, **kwargs):
+        if (parent is not None) and parent.isValid():
+            return 0
+        return len(self.ledger)
+
+
+    def columnCount(self, parent = None, *args, **kwargs):
+        if (parent is not None) and parent.isValid():
+            return 0
+        return len(Ledger.COLUMNS)
+
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if not (row < len(self.ledger) and col < len(Ledger.COLUMNS)):
+            return None
+        if role == Qt.DisplayRole:
+            value = self.ledger.rows[row][col]
+            return '' if value is None else str(value)
+        if role == Qt.BackgroundRole:
+            if self.ledger.rows[row][3] is not None:
+                return brush(self.ledger.direction(row) or 'NA')
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return Ledger.COLUMNS[section] if 0 <= section < len(Ledger.COLUMNS) else None
+        return section + 1
+
+
+    def bought(self, sym, qty, price):
+        row = len(self.ledger)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.ledger.bought(sym, qty, price)
+        self.endInsertRows()
+
+
+    def sold(self, sym, qty, buyPrice, price):
+        row = self.ledger.openRow(sym)
+        if row is not None:
+            self.ledger.sold(sym, qty, buyPrice, price)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(Ledger.COLUMNS) - 1))
+        elif not self.ledger.rowsFor(sym):
+            row = len(self.ledger)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.ledger.sold(sym, qty, buyPrice, price)
+            self.endInsertRows()
+
+
+class Transactions(QTableView):
+    """ View of the day's trade ledger.
+
+    bought()/sold() may be called from the worker threads, the fills are queued to the GUI
+    thread before they touch the model.
+    """
+    _fill = pyqtSignal(str, tuple)
+
     def __init__(self, parent = None):
-        QTableWidget.__init__(self, parent)
+        QTableView.__init__(self, parent)
+        self.ledgerModel = LedgerModel()
+        self.setModel(self.ledgerModel)
+        self._fill.connect(self._apply, Qt.QueuedConnection)
+
+
+    def _apply(self, side, fill):
+        if side == 'Buy':
+            self.ledgerModel.bought(*fill)
+        else:
+            self.ledgerModel.sold(*fill)
+
+
+    def _record(self, side, fill):
+        if QThread.currentThread() != self.thread():
+            self._fill.emit(side, fill)
+        else:
+            self._apply(side, fill)
 
 
     def bought(self, tick):
-        _row = self.rowCount()
-        self.insertRow(_row)
-        data = [tick.T, tick.PQ, tick.C, '']
-        for item in range(len(data)):
-            tItem = QTableWidgetItem(str(data[item]))
-            tItem.setTextAlignment(Qt.AlignCenter)
-            self.setItem(_row, item, tItem)
+        self._record('Buy', (tick.T, tick.PQ, tick.C))
 
 
     def sold(self, tick):
-        results = self.findItems(tick.T, Qt.MatchExactly)
-        if results:
-            for row in results:
-                _row = row.row()
-                if not self.item(_row, 3).text():
-                    tItem = QTableWidgetItem(str(tick.C))
-                    tItem.setTextAlignment(Qt.AlignCenter)
-                    self.setItem(_row, 3, tItem)
-
-                    for j in range(self.columnCount()):
-                        if tick.prevProfit > 0:
-                            self.item(_row, j).setBackground(color('G'))
-                        elif tick.prevProfit < 0:
-                            self.item(_row, j).setBackground(color('R'))
-                        else:
-                            self.item(_row, j).setBackground(color('NA'))
-        else:
-            _row = self.rowCount()
-            self.insertRow(_row)
-            data = [tick.T, tick.Q, tick.AP, tick.C]
-            for item in range(len(data)):
-                tItem = QTableWidgetItem(str(data[item]))
-                tItem.setTextAlignment(Qt.AlignCenter)
-                self.setItem(_row, item, tItem)
-
-            for j in range(self.columnCount()):
-                if tick.C > tick.AP:
-                    self.item(_row, j).setBackground(color('G'))
-                elif tick.AP < tick.C:
-                    self.item(_row, j).setBackground(color('R'))
-                else:
-                    self.item(_row, j).setBackground(color('NA'))
\ No newline at end of file
+        self._record('Sell', (tick.T, tick.Q, tick.AP, tick.C))
@@ -0,0 +1,228 @@
+'''
+Strategy parameter sweep, every set of Params is backtested over the same
+local data across a pool of processes and the results ranked by profit
+
+Finished runs are appended to a JSON lines checkpoint as they come in, so a sweep
+that's stopped picks up where it left off when it's run again with the same file
+
+    $ python Sweep.py --tape tapes --grid zigDelta=0.005,0.01,0.02 stopLoss=0.03,0.05
+    $ python Sweep.py --syms 100 --random 200 zigDelta=0.002:0.03 buyRecency=2:10
+'''
+import argparse, itertools, json, logging, os, random, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Tick import Params, DEFAULT_PARAMS
+from Backtest import Backtest, synthetic, fromBars
+
+
+#The stream each worker process replays, loaded once per process
+_stream = None
+
+
+def load(source):
+    '''
+    Reads a whole stream into memory
+
+    Args:
+        source (tuple): ('tape', path), ('bars', path, day) or ('synthetic', syms, steps, seed)
+
+    Returns:
+        (list): [(epoch ms, {Sym : quote data})]
+    '''
+    kind = source[0]
+    if kind == 'tape':
+        from resources.Tape import TapeReader
+        return list(TapeReader(source[1]).quotes())
+    if kind == 'bars':
+        from resources.Bars import BarStore
+        store = BarStore(source[1])
+        try:
+            return list(fromBars(store, day = source[2]))
+        finally:
+            store.close()
+    return list(synthetic(source[1], source[2], seed = source[3]))
+
+
+def _init(source):
+    global _stream
+    #The strategy logs every decision, which would swamp the sweep
+    logging.getLogger().setLevel(logging.WARNING)
+    _stream = load(source)
+
+
+def evaluate(params, purPrice = 1000, cash = 25000):
+    '''
+    Backtests one set of params over the process' stream
+
+    Args:
+        params (Params): strategy constants
+        purPrice (float): amount spent on each purchase
+        cash (float): cash to start with
+
+    Returns:
+        (dict): the params and how they did
+    '''
+    result = Backtest(purPrice, cash = cash, params = params).run(_stream)
+    sells = [trade for trade in result.trades if trade.side == 'Sell']
+    return {
+        'Params' : params._asdict(),
+        'Profit' : round(result.profit, 2),
+        'Trades' : len(sells),
+        'Wins' : sum(1 for trade in sells if trade.profit > 0),
+        'Seconds' : round(result.seconds, 3)
+    }
+
+
+def grid(space):
+    '''
+    Every combination of the values
+
+    Args:
+        space (dict): {Param : [values]}, params left out keep their defaults
+
+    Returns:
+        (list): Params
+    '''
+    names = list(space)
+    return [DEFAULT_PARAMS._replace(**dict(zip(names, values)))
+            for values in itertools.product(*[space[name] for name in names])]
+
+
+def randomSearch(space, num, seed = 0):
+    '''
+    Random draws from the space
+
+    Args:
+        space (dict): {Param : [values] to choose from, or a (low, high) range},
+            ranges of ints draw ints
+        num (int): how many Params to draw
+        seed (int): random seed, the same seed draws the same Params
+
+    Returns:
+        (list): Params
+    '''
+    rng = random.Random(seed)
+
+    def draw(values):
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                return rng.randint(low, high)
+            return rng.uniform(low, high)
+        return rng.choice(values)
+
+    return [DEFAULT_PARAMS._replace(**{name : draw(values) for name, values in space.items()})
+            for _ in range(num)]
+
+
+def _key(params):
+    return json.dumps(params._asdict() if isinstance(params, Params) else params, sort_keys = True)
+
+
+def sweep(source, candidates, checkpoint = None, workers = None, purPrice = 1000, cash = 25000):
+    '''
+    Backtests every candidate, skipping ones already in the checkpoint
+
+    Args:
+        source (tuple): data to replay, see `load`
+        candidates (list): Params to try
+        checkpoint (str): JSON lines file finished runs are appended to and resumed from,
+            only runs over the same source are picked back up
+        workers (int): processes to use, every core if None
+        purPrice (float): amount spent on each purchase
+        cash (float): cash to start with
+
+    Returns:
+        (list): result dicts, best profit first
+    '''
+    done = {}
+    if checkpoint and os.path.isfile(checkpoint):
+        with open(checkpoint, 'r') as fileIn:
+            for line in fileIn:
+                try:
+                    res = json.loads(line)
+                    if res['Source'] == list(source):
+                        done[_key(res['Params'])] = res
+                except (json.decoder.JSONDecodeError, KeyError):
+                    #A run cut off mid write
+                    pass
+
+    pending = {_key(params) : params for params in candidates if _key(params) not in done}
+    logging.info('---- {} to Run, {} Already Done ----'.format(len(pending), len(candidates) - len(pending)))
+
+    out = open(checkpoint, 'a') if checkpoint else None
+    try:
+        with ProcessPoolExecutor(workers, initializer = _init, initargs = (source, )) as pool:
+            futures = [pool.submit(evaluate, params, purPrice, cash) for params in pending.values()]
+            for future in as_completed(futures):
+                res = future.result()
+                res['Source'] = list(source)
+                done[_key(res['Params'])] = res
+                if out:
+                    out.write(json.dumps(res) + '\n')
+                    out.flush()
+    finally:
+        if out:
+            out.close()
+
+    wanted = {_key(params) for params in candidates}
+    return sorted((res for key, res in done.items() if key in wanted), key = lambda res: res['Profit'], reverse = True)
+
+
+def _space(pairs):
+    #Parses name=a,b,c (values) and name=low:high (range) arguments
+    space = {}
+    for pair in pairs:
+        name, values = pair.split('=')
+        if name not in Params._fields:
+            raise SystemExit('Unknown param {}, expected one of {}'.format(name, ', '.join(Params._fields)))
+        cast = type(getattr(DEFAULT_PARAMS, name))
+        if ':' in values:
+            space[name] = tuple(cast(val) for val in values.split(':'))
+        else:
+            space[name] = [cast(val) for val in values.split(',')]
+    return space
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Sweeps the Tick strategy constants')
+    parser.add_argument('space', nargs = '+', help = 'name=a,b,c or name=low:high')
+    parser.add_argument('--grid', action = 'store_true', help = 'every combination, the default')
+    parser.add_argument('--random', type = int, help = 'this many random draws instead')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--tape', help = 'replay a recorded tape file, or a folder of them')
+    parser.add_argument('--bars', help = 'replay a BarStore file')
+    parser.add_argument('--day', help = 'YYYYMMDD day of the bars, the latest if not given')
+    parser.add_argument('--syms', type = int, default = 50, help = 'synthetic symbols')
+    parser.add_argument('--steps', type = int, default = 4680, help = 'synthetic updates per symbol')
+    parser.add_argument('--workers', type = int, help = 'processes, every core if not given')
+    parser.add_argument('--checkpoint', default = 'sweep.jsonl')
+    parser.add_argument('--top', type = int, default = 10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level = logging.INFO, format = '%(message)s')
+
+    if args.tape:
+        source = ('tape', args.tape)
+    elif args.bars:
+        source = ('bars', args.bars, args.day)
+    else:
+        source = ('synthetic', args.syms, args.steps, args.seed)
+
+    space = _space(args.space)
+    if args.random:
+        candidates = randomSearch(space, args.random, args.seed)
+    else:
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                raise SystemExit('{} is a range, ranges need --random'.format(name))
+        candidates = grid(space)
+
+    start = time.perf_counter()
+    results = sweep(source, candidates, args.checkpoint, args.workers)
+    logging.info('---- {} Runs in {:.1f}s ----'.format(len(results), time.perf_counter() - start))
+
+    for rank, res in enumerate(results[:args.top], 1):
+        print('{:3}. {:10.2f} {:4} trades {:4} wins  {}'.format(
+            rank, res['Profit'], res['Trades'], res['Wins'],
+            ' '.join('{}={}'.format(name, val) for name, val in res['Params'].items()
+                     if val != getattr(DEFAULT_PARAMS, name))))
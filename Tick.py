@@ -1,7 +1,6 @@
 import resources.gfc as gfc
-from collections import deque
-import pandas as pd
-from numpy import NaN, Inf, arange, isscalar, asarray, array, mean, diff, polyfit
+from collections import namedtuple
+from numpy import NaN, Inf, arange, isscalar, asarray, array, diff, empty, int64, float64
 import logging, datetime, pytz
 
 def zigzag(data, delta):
@@ -48,36 +47,417 @@ def zigzag(data, delta):
     return peaks, valls 
  
 
+#Default amount of prices a Tick holds on to, a full day of minute bars plus 5 second polls
+STACK_CAPACITY = 8192
+#Shared by every PriceStack that hasn't been pushed to yet
+_NO_TIMES, _NO_PRICES = empty(0, dtype = int64), empty(0, dtype = float64)
+
+#Strategy constants, Ticks share the defaults unless they're given their own
+#   zigDelta: fraction of the mean price a swing has to exceed to make a peak/valley
+#   stopLoss: fraction under the purchase price the stop loss is put at
+#   buyRecency: how many prices ago a valley can be and still trigger a buy
+#   sellRecency: how many prices ago a peak can be and still trigger a sale
+#   pennyRev: rises in a row a penny stock needs before it's bought
+#   trendGate: slope of the stack's fit under which nothing's bought
+Params = namedtuple('Params', ['zigDelta', 'stopLoss', 'buyRecency', 'sellRecency', 'pennyRev', 'trendGate'])
+DEFAULT_PARAMS = Params(zigDelta = 0.01, stopLoss = 0.05, buyRecency = 5, sellRecency = 4, pennyRev = 3, trendGate = -1.0)
+
+
+class PriceStack():
+    '''
+    Fixed capacity ring buffer of (timestamp, price) points backed by NumPy arrays
+
+    Each point is written twice, at i and i + size, so the newest n points are always 
+    one contiguous slice and can be handed out as views without copying. The arrays
+    start small and double until they reach capacity, after that the oldest points 
+    are overwritten
+
+    Args:
+        capacity (int): the most points that are kept
+    '''
+    __slots__ = ('capacity', 'count', '_len', '_head', '_size', '_t', '_p')
+
+    def __init__(self, capacity = STACK_CAPACITY):
+        self.capacity = max(int(capacity), 2)
+        #Total points ever pushed, positions handed out are relative to this
+        self.count = 0
+        self._len, self._head = 0, 0
+        #Nothing is allocated until the first push
+        self._size, self._t, self._p = 0, _NO_TIMES, _NO_PRICES
+
+
+    def _alloc(self, size):
+        self._size = size
+        self._t = empty(2 * size, dtype = int64)
+        self._p = empty(2 * size, dtype = float64)
+
+
+    def _grow(self, need):
+        #Only called before the buffer has ever wrapped, so the points sit at [0, len)
+        size = self._size or min(self.capacity, 8)
+        while size < need and size < self.capacity:
+            size = min(size * 2, self.capacity)
+        if size == self._size: return
+
+        t, p = self.times(), self.prices()
+        self._alloc(size)
+        n = len(t)
+        self._t[:n], self._t[size:size + n] = t, t
+        self._p[:n], self._p[size:size + n] = p, p
+        self._head = n
+
+
+    def __len__(self):
+        return self._len
+
+
+    @property
+    def offset(self):
+        #Position of the oldest point still held
+        return self.count - self._len
+
+
+    def append(self, stamp, price):
+        '''
+        Pushes a point onto the end of the stack
+
+        Args:
+            stamp (int): epoch time in milliseconds
+            price (float): price at that time
+
+        Returns:
+            None
+        '''
+        if self._len == self._size:
+            self._grow(self._size + 1)
+
+        size, i = self._size, self._head
+        self._t[i] = self._t[i + size] = stamp
+        self._p[i] = self._p[i + size] = price
+        self._head = (i + 1) % size
+        self._len = min(self._len + 1, size)
+        self.count += 1
+
+
+    def extend(self, stamps, prices):
+        '''
+        Pushes a batch of points onto the end of the stack
+
+        Args:
+            stamps (array): epoch times in milliseconds
+            prices (array): prices at those times
+
+        Returns:
+            None
+        '''
+        stamps, prices = asarray(stamps, dtype = int64), asarray(prices, dtype = float64)
+        num = len(prices)
+        if not num: return
+
+        self._grow(self._len + num)
+        size = self._size
+        #Anything that would be overwritten straight away is skipped
+        keep = min(num, size)
+        idx = (self._head + arange(num - keep, num)) % size
+        self._t[idx] = self._t[idx + size] = stamps[num - keep:]
+        self._p[idx] = self._p[idx + size] = prices[num - keep:]
+        self._head = (self._head + num) % size
+        self._len = min(self._len + num, size)
+        self.count += num
+
+
+    def _window(self, arr, n):
+        n = self._len if n is None else min(n, self._len)
+        end = self._head + self._size
+        return arr[end - n:end]
+
+
+    def prices(self, n = None):
+        #View of the newest n prices (all if None), oldest first
+        return self._window(self._p, n)
+
+
+    def times(self, n = None):
+        #View of the newest n timestamps (all if None), oldest first
+        return self._window(self._t, n)
+
+
+    def last(self):
+        return self._p[self._head + self._size - 1]
+
+
+    def age(self, pos):
+        #How many points ago position `pos` was pushed, 0 being the newest
+        return self.count - 1 - pos
+
+
+class ZigZag():
+    '''
+    Streaming version of `zigzag` over a PriceStack, consumes the prices as they're
+    pushed instead of re-scanning the whole stack every update
+
+    The delta is `scale` times the running mean of every price seen, so it moves 
+    a little with each price. Every comparison made along the way is remembered 
+    as a bound on the delta, [lo, hi), that keeps all of the previous flips the 
+    same. While the new delta stays in those bounds the peaks and valleys are 
+    exactly what `zigzag` would return, otherwise the held prices are replayed.
+    Positions are absolute (see `PriceStack.count`), so they stay put when old
+    prices fall off the stack
+
+    Args:
+        stack (PriceStack): prices being tracked
+        scale (float): fraction of the mean price a swing needs to exceed
+    '''
+    __slots__ = ('stack', 'scale', 'seen', 'total', 'peaks', 'valls', 'minVal', 'maxVal',
+                 'minPos', 'maxPos', 'maxFlip', 'lo', 'hi')
+    #Relative slack kept between the delta and its bounds, covers float rounding
+    EPS = 1e-9
+
+    def __init__(self, stack, scale = 0.01):
+        self.stack = stack
+        self.scale = scale
+        self.seen = 0
+        self.total = 0.0
+        self._reset()
+
+
+    def _reset(self):
+        self.peaks, self.valls = [], []
+        self.minVal, self.maxVal = Inf, -Inf
+        self.minPos, self.maxPos = NaN, NaN
+        self.maxFlip = True
+        self.lo, self.hi = -Inf, Inf
+
+
+    @property
+    def delta(self):
+        return (self.total / self.seen) * self.scale if self.seen else 0.0
+
+
+    @property
+    def PV(self):
+        return [self.peaks, self.valls]
+
+
+    def _step(self, i, val, delta):
+        '''
+        One iteration of the `zigzag` loop, also narrowing the valid delta bounds
+
+        Args:
+            i (int): position of the price in the stack
+            val (float): the price
+            delta (float): value that the change needs to be greater than
+
+        Returns:
+            None
+        '''
+        if val > self.maxVal:
+            self.maxVal = val
+            self.maxPos = i
+        if val < self.minVal:
+            self.minVal = val
+            self.minPos = i
+
+        if self.maxFlip:
+            if val < self.maxVal - delta:
+                self.peaks.append((self.maxPos, self.maxVal))
+                self.hi = min(self.hi, self.maxVal - val)
+                self.minVal = val
+                self.minPos = i
+                self.maxFlip = False
+            else:
+                self.lo = max(self.lo, self.maxVal - val)
+        else:
+            if val > self.minVal + delta:
+                self.valls.append((self.minPos, self.minVal))
+                self.hi = min(self.hi, val - self.minVal)
+                self.maxVal = val
+                self.maxPos = i
+                self.maxFlip = True
+            else:
+                self.lo = max(self.lo, val - self.minVal)
+
+
+    def _valid(self, delta):
+        #Whether the current state would come out the same with this delta
+        slack = abs(delta) * self.EPS
+        return self.lo + slack < delta < self.hi - slack
+
+
+    def _replay(self, delta):
+        self._reset()
+        for i, val in enumerate(self.stack.prices().tolist(), self.stack.offset):
+            self._step(i, val, delta)
+
+
+    def update(self):
+        '''
+        Catches up on whatever has been pushed to the stack since the last call
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        new = self.stack.count - self.seen
+        if new <= 0: return
+
+        prices = self.stack.prices(new).tolist()
+        self.total += sum(prices)
+        self.seen = self.stack.count
+        delta = self.delta
+
+        if new == 1 and self._valid(delta):
+            self._step(self.seen - 1, prices[0], delta)
+        else:
+            self._replay(delta)
+
+
+class Trend():
+    '''
+    Least squares slope of a PriceStack kept with running sums, so the trend 
+    check doesn't have to refit the whole stack every time
+
+    x is the position of the price, y the price less the first price seen (the
+    slope doesn't change, the sums just stay small). The x sums have a closed 
+    form, only sum y and sum xy are carried
+
+    Args:
+        stack (PriceStack): prices being tracked
+        window (int): only fit the newest `window` prices, None for the whole session
+    '''
+    __slots__ = ('stack', 'window', 'seen', 'anchor', 'sy', 'sxy')
+
+    def __init__(self, stack, window = None):
+        self.stack = stack
+        #A window can't reach back further than the stack holds
+        self.window = window if window is None else min(window, stack.capacity)
+        self.seen = 0
+        self.anchor = None
+        self.sy, self.sxy = 0.0, 0.0
+
+
+    @property
+    def start(self):
+        #Position of the first price in the fit
+        return 0 if self.window is None else max(0, self.seen - self.window)
+
+
+    def _add(self, first, prices, sign = 1):
+        for i, y in enumerate(prices, first):
+            y -= self.anchor
+            self.sy += sign * y
+            self.sxy += sign * i * y
+
+
+    def _refit(self):
+        #Window slid further than the stack can account for, sum the window from scratch
+        self.sy, self.sxy = 0.0, 0.0
+        prices = self.stack.prices(self.seen - self.start).tolist()
+        self._add(self.start, prices)
+
+
+    def update(self):
+        '''
+        Catches up on whatever has been pushed to the stack since the last call
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        new = self.stack.count - self.seen
+        if new <= 0: return
+
+        prices = self.stack.prices(new).tolist()
+        if self.anchor is None:
+            self.anchor = prices[0]
+
+        oldStart = self.start
+        self._add(self.seen, prices)
+        self.seen = self.stack.count
+
+        drop = self.start - oldStart
+        if drop > 0:
+            #The prices sliding out of the window need to still be on the stack
+            if self.seen - oldStart <= len(self.stack):
+                self._add(oldStart, self.stack.prices(self.seen - oldStart)[:drop].tolist(), -1)
+            else:
+                self._refit()
+
+
+    @property
+    def slope(self):
+        a, n = self.start, self.seen - self.start
+        if n < 2: return 0.0
+
+        b = a + n
+        sx = (b * (b - 1) - a * (a - 1)) // 2
+        sxx = ((b - 1) * b * (2 * b - 1) - (a - 1) * a * (2 * a - 1)) // 6
+        return (n * self.sxy - sx * self.sy) / (n * sxx - sx * sx)
+
+
+def _num(val):
+    #Quote values come in as '' when missing, those are NaN here
+    if val.__class__ is float: return val
+    return NaN if val == '' or val is None else float(val)
+
+
 class Tick():
-    def __init__(self, tick = '', purPrice = 0, trader = '', spy = '', ah = False):
-        self.__dict__.update({
-            'T' : tick,                     #Ticker Symbol
-            'C' : '',                       #Current Price
-            'A' : '',                       #Last Ask Price
-            'CP' : [],                      #Price Change [$,%]
-            'V' : '',                       #Volume
-            'AV' : '',                      #Average Volume
-            'D' : '',                       #Direction of change
-            'PQ' : 0,                       #Proposed quantity
-            'PC' : '',                      #Previous Close
-            'TD' : [],                      #Todays Data [Low, High]
-            'YD' : [],                      #Years Data [Low, High]
-            'Q' : None,                     #Quantity, once purchased
-            'AP' : None,                    #Average Price, once purchased
-            'SL' : None,                    #Stop Loss, once purchased
-            'SPY' : spy,                    #Tracks the SPY ETF for algo
-            'PV' : [[], []]                 #The peaks and valleys of the stack [[P], [V]]
-        })
+    #Fixed attribute layout, a big screener universe of these adds up fast
+    __slots__ = (
+        'T',                            #Ticker Symbol
+        'C',                            #Current Price
+        'A',                            #Last Ask Price
+        'CH', 'CPct',                   #Price Change $, %
+        'V',                            #Volume
+        'AV',                           #Average Volume
+        'D',                            #Direction of change
+        'PQ',                           #Proposed quantity
+        'PC',                           #Previous Close
+        'TL', 'TH',                     #Todays Low, High
+        'YL', 'YH',                     #Years Low, High
+        'Q',                            #Quantity, 0 until purchased
+        'AP',                           #Average Price, once purchased
+        'SL',                           #Stop Loss, once purchased
+        'SPY',                          #Tracks the SPY ETF for algo
+        'PV',                           #The peaks and valleys of the stack [[P], [V]]
+        'tradeable', 'transID', 'stack', 'zz', 'trend', 'prevProfit', '_revert',
+        'trader', 'buyRev', 'sellRev', 'params'
+    )
+
+    def __init__(self, tick = '', purPrice = 0, trader = '', spy = '', ah = False, capacity = STACK_CAPACITY,
+                 params = DEFAULT_PARAMS):
+        #Missing prices are NaN rather than '', so every price field is always a float
+        self.T = tick
+        self.C = self.A = self.PC = NaN
+        self.CH = self.CPct = NaN
+        self.TL = self.TH = self.YL = self.YH = NaN
+        self.V, self.AV = 0, 0
+        self.D = ''
+        self.PQ = 0
+        self.Q, self.AP, self.SL = 0, NaN, NaN
+        self.SPY = spy
+        self.PV = [[], []]
+        #Strategy constants
+        self.params = params
 
         #Whether this will be trade
         self.tradeable = True
         #transID ID (side, ID)
         self.transID = None
-        #A stack of last 10 closing prices, used to determine Sell/Buy
-        self.stack = []
+        #A stack of the days prices, used to determine Sell/Buy
+        self.stack = PriceStack(capacity)
+        #Peaks and valleys of the stack, kept up to date a price at a time
+        self.zz = ZigZag(self.stack, params.zigDelta)
+        #Running linear fit of the stack, used to avoid downward trends
+        self.trend = Trend(self.stack)
         #Previous profit
         self.prevProfit = 0
         #Revert tuple incase of failure to purchase, resets Tick
+        #(Q, AP, SL, buyRev, transID)
         self._revert = ()
         #Robinhood trader object
         self.trader = trader
@@ -85,7 +465,25 @@ class Tick():
         self.buyRev, self.sellRev = 0, 0
 
 
-    def update(self, data, purPrice, spy):
+    @property
+    def CP(self):
+        #Price Change ($, %)
+        return (self.CH, self.CPct)
+
+
+    @property
+    def TD(self):
+        #Todays Data [Low, High]
+        return [self.TL, self.TH]
+
+
+    @property
+    def YD(self):
+        #Years Data [Low, High]
+        return [self.YL, self.YH]
+
+
+    def update(self, data, purPrice, spy, bars = None, stamp = None):
         '''
         Updates the ticker to its current values
 
@@ -93,42 +491,47 @@ class Tick():
             data (dict): current tick information
             purPrice (float): amount allocated to purchase stock at
             spy (str): current s&p value (R/G)
+            bars (BarStore): where the first update warms the stack up from, straight
+                from gfc if None, no warm-up if False
+            stamp (int): epoch ms the data is from, now if None
 
         Returns:
             (bool): whether the fetch to nasdaq was successful
         '''
-        if len(self.stack) == 0 and self.tradeable:
-            prevData = gfc.get_price_data({'q': self.T, 'i': '60', 'p': '1d'})
-            self.stack = [(idx.time(), row['Close']) for idx, row in prevData.iterrows()]
+        if len(self.stack) == 0 and self.tradeable and bars is not False:
+            if bars is None:
+                prevData = gfc.get_prices({'q': self.T, 'i': '60', 'p': '1d'})
+                self.stack.extend(prevData.T, prevData.Close)
+            else:
+                bars.warm(self.stack, self.T)
 
         if data and type(data['LTP']) == float:
             curPrice = data['LTP']
-            self.stack.append((datetime.datetime.now().time(), curPrice))
+            if stamp is None:
+                stamp = int(datetime.datetime.now().timestamp() * 1000)
+            self.stack.append(stamp, curPrice)
+            self.zz.update()
+            self.trend.update()
             
-            #List of peaks and valleys to be updated to __dict__
-            ps_vs = [[], []]
-
-            if curPrice > 1:
-                #If a full stack, perform analysis
-                if len(self.stack) >= 5:
-                    prices = [i[1] for i in self.stack]
-                    delta = mean(prices) * 0.01
-                    ps_vs = list(zigzag(prices, delta))
-
-
-            self.__dict__.update({
-                'C' : data['LTP'],
-                'A' : data['LAP'],
-                'CP' : (data['C'], data['CP']),
-                'V' : data['V'],
-                'PC' : data['PC'],
-                'TD' : [data['TL'], data['TH']],
-                'YD' : [data['YL'], data['YH']],
-                'D' : data['D'],
-                'PQ' : int(purPrice / data['LTP']),
-                'SPY' : spy,
-                'PV' : ps_vs
-            })
+            #Peaks and valleys only count once there's a full stack
+            if curPrice > 1 and len(self.stack) >= 5:
+                self.PV = self.zz.PV
+            else:
+                self.PV = [[], []]
+
+            self.C = curPrice
+            self.A = _num(data['LAP'])
+            self.CH = _num(data['C'])
+            self.CPct = _num(data['CP'])
+            self.V = data['V'] or 0
+            self.PC = _num(data['PC'])
+            self.TL = _num(data['TL'])
+            self.TH = _num(data['TH'])
+            self.YL = _num(data['YL'])
+            self.YH = _num(data['YH'])
+            self.D = data['D']
+            self.PQ = int(purPrice / curPrice)
+            self.SPY = spy
 
             return True
         else: return False
@@ -144,15 +547,9 @@ class Tick():
         Returns:
             None
         ''' 
-        self._revert = {
-            'Q' : self.Q, 
-            'AP' : self.AP, 
-            'SL' : self.SL,
-            'Buy' : self.buyRev,
-            'transID' : self.transID
-        }
+        self._revert = (self.Q, self.AP, self.SL, self.buyRev, self.transID)
         self.prevProfit = (self.Q * self.C) - (self.Q * self.AP)
-        self.Q, self.AP, self.SL, self.transID = None, None, None, None        
+        self.Q, self.AP, self.SL, self.transID = 0, NaN, NaN, None
 
 
     def toSell(self, purPrice, spy):
@@ -194,13 +591,13 @@ class Tick():
                     if len(self.PV[0]) > 0:
                         #If the peak has an idex of >5, the peak occured w/in the last 15 seconds
                         #so therefore it'd be good to sell
-                        if self.PV[0][-1][0] > len(self.stack) - 5:
+                        if self.stack.age(self.PV[0][-1][0]) < self.params.sellRecency:
                             return True
 
         return False
 
 
-    def _open(self, rhood):
+    def open(self, rhood = False):
         '''
         Actually purchases the ticker by setting the pos variables accordingly
 
@@ -210,17 +607,11 @@ class Tick():
         Returns:
             None
         ''' 
-        self._revert = {
-            'Q' : self.Q, 
-            'AP' : self.AP, 
-            'SL' : self.SL,
-            'Buy' : self.buyRev,
-            'transID' : self.transID
-        }
+        self._revert = (self.Q, self.AP, self.SL, self.buyRev, self.transID)
 
         if not rhood:
             if self.C > 1:
-                sellLimit = round(self.C - (self.C * 0.05), 2)
+                sellLimit = round(self.C - (self.C * self.params.stopLoss), 2)
                 #Redundancy, some penny stocks seem to slip through this crack and I have
                 #no idea why
                 if sellLimit < 1: sellLimit = 0
@@ -235,7 +626,7 @@ class Tick():
         self.buyRev = 0
 
 
-    def toBuy(self, purPrice, spy, forced = False, rhood = False):
+    def toBuy(self, purPrice, spy, forced = False, rhood = False, opening = True):
         '''
         Determines whether to purchase the ticker based on the current strategy
 
@@ -244,13 +635,15 @@ class Tick():
             spy (str): current s&p value (R/G)
             forced (bool): whether it's being forced to be purchased
             rhood (bool/tuple): if there is info to auto populate if forced to purchase
+            opening (bool): whether a buy opens the position here, if False it's only
+                decided and the position is left for open() to set
 
         Returns:
             (bool): determination of whether to buy or not
         '''
         if forced:
             logging.info('{} Forced Purchase at {}'.format(self.T, self.C))
-            self._open(rhood)
+            self.open(rhood)
             return True
 
         #We don't want a penny stock with a wide (relatively) spread
@@ -261,30 +654,29 @@ class Tick():
         #If there's ample data, fit that shit, we're looking for positive upward trends.
         #We don't want to go down with the ship
         if len(self.stack) > 100:
-            prices = [i[1] for i in self.stack]
-            fit = polyfit(range(len(prices)), prices, 1)[0]
-            if fit < -1: 
+            if self.trend.slope < self.params.trendGate:
                 return False
 
         if self.C > 1:
             if len(self.PV[1]) > 0:
                 #If the peak has an index which occured w/in the last 15 (5 * 3) seconds
                 #so therefore it'd be good to sell
-                if self.PV[1][-1][0] > (len(self.stack) - 1) - 5:
-                    self._open(rhood)
+                if self.stack.age(self.PV[1][-1][0]) < self.params.buyRecency:
+                    if opening: self.open(rhood)
                     return True
         else:
+            prev, last = self.stack.prices(2)
             #If the last price is less than the price before
-            if self.stack[-1][1] < self.stack[-2][1]:
+            if last < prev:
                 self.buyRev = 0
             #Elif the last price is greater than the price before
-            elif self.stack[-1][1] > self.stack[-2][1]:
+            elif last > prev:
                 self.buyRev += 1
             else:
                 pass
 
-            if self.buyRev == 3:
-                self._open(rhood)
+            if self.buyRev == self.params.pennyRev:
+                if opening: self.open(rhood)
                 return True
              
 
@@ -298,5 +690,6 @@ class Tick():
         Returns:
             None
         '''
-        self.__dict__.update(self._revert)
+        if self._revert:
+            self.Q, self.AP, self.SL, self.buyRev, self.transID = self._revert
 
@@ -0,0 +1,190 @@
+import threading
+
+
+class TickList():
+    '''
+    Ordered collection of Tick objects keyed by their symbol
+
+    Looks like a list to ObjListTableModel (len, row indexing, insert, del), but
+    membership and symbol lookup go through a dict. Row numbers are kept in a
+    second dict, a removal/insert only marks the rows from where it happened as
+    stale, and those are renumbered as far as they're needed the next time a row
+    is asked for.
+    version counts the inserts/removals, so a model can tell nothing moved
+    without comparing the rows.
+    Only one Tick per symbol is held
+
+    Args:
+        ticks (list): Ticks to start with
+    '''
+    def __init__(self, ticks = ()):
+        self._ticks = []
+        #{Sym : Tick}, {Sym : Row}
+        self._bySym, self._rows = {}, {}
+        #First row whose number in _rows may be out of date
+        self._stale = 0
+        #Bumped on every insert/removal
+        self.version = 0
+        self.lock = threading.RLock()
+
+        for tick in ticks:
+            self.append(tick)
+
+
+    def __len__(self):
+        return len(self._ticks)
+
+
+    def __iter__(self):
+        #Iterates over a copy so the list can be changed while looping over it
+        return iter(list(self._ticks))
+
+
+    def __getitem__(self, i):
+        return self._ticks[i]
+
+
+    def __delitem__(self, i):
+        with self.lock:
+            if isinstance(i, slice):
+                first = i.indices(len(self._ticks))[0]
+                removed = self._ticks[i]
+            else:
+                first = i % len(self._ticks) if self._ticks else 0
+                removed = [self._ticks[i]]
+            for tick in removed:
+                del self._bySym[tick.T]
+                self._rows.pop(tick.T, None)
+            del self._ticks[i]
+            self._stale = min(self._stale, first)
+            self.version += 1
+
+
+    def __contains__(self, item):
+        #Accepts either a symbol or a Tick
+        if isinstance(item, str):
+            return item in self._bySym
+        return self._bySym.get(getattr(item, 'T', None)) is item
+
+
+    def __repr__(self):
+        return 'TickList({})'.format(self.symbols())
+
+
+    def _sym(self, item):
+        return item if isinstance(item, str) else item.T
+
+
+    def get(self, sym, default = None):
+        return self._bySym.get(sym, default)
+
+
+    def symbols(self):
+        return [tick.T for tick in self._ticks]
+
+
+    def index(self, item):
+        '''
+        Row of a tick
+
+        Args:
+            item (Tick/str): the Tick or its symbol
+
+        Returns:
+            (int): the row, raises ValueError if it isn't held
+        '''
+        sym = self._sym(item)
+        with self.lock:
+            if sym not in self._bySym:
+                raise ValueError('{} is not in the list'.format(sym))
+            row = self._rows.get(sym)
+            if row is None or row >= len(self._ticks) or self._ticks[row].T != sym:
+                row = self._renumber(sym)
+            return row
+
+
+    def _renumber(self, sym):
+        #Rows before the first stale one are always right, so the symbol's is found by
+        #renumbering from there up to it
+        ticks = self._ticks
+        for row in range(self._stale, len(ticks)):
+            self._rows[ticks[row].T] = row
+            if ticks[row].T == sym:
+                self._stale = row + 1
+                return row
+
+
+    def append(self, tick):
+        '''
+        Adds a tick to the end, unless its symbol is already held
+
+        Args:
+            tick (Tick): tick to add
+
+        Returns:
+            (bool): whether it was added
+        '''
+        with self.lock:
+            if tick.T in self._bySym: return False
+            self._bySym[tick.T] = tick
+            self._rows[tick.T] = len(self._ticks)
+            if self._stale == len(self._ticks):
+                self._stale += 1
+            self._ticks.append(tick)
+            self.version += 1
+            return True
+
+
+    def insert(self, i, tick):
+        with self.lock:
+            if tick.T in self._bySym: return False
+            self._bySym[tick.T] = tick
+            first = min(max(i + len(self._ticks) if i < 0 else i, 0), len(self._ticks))
+            self._ticks.insert(i, tick)
+            self._stale = min(self._stale, first)
+            self.version += 1
+            return True
+
+
+    def remove(self, item):
+        '''
+        Removes a tick, raises ValueError if it isn't held
+
+        Args:
+            item (Tick/str): the Tick or its symbol
+
+        Returns:
+            None
+        '''
+        with self.lock:
+            del self[self.index(item)]
+
+
+    def pop(self, i = -1):
+        with self.lock:
+            tick = self._ticks[i]
+            del self[i]
+            return tick
+
+
+    def moveTo(self, item, other):
+        '''
+        Moves a tick from this list to the end of another in one step, both
+        lists are locked so nobody sees it in both or neither
+
+        Args:
+            item (Tick/str): the Tick or its symbol
+            other (TickList): list to move it to
+
+        Returns:
+            (Tick): the tick moved, None if it wasn't in this list
+        '''
+        first, second = sorted((self, other), key = id)
+        with first.lock, second.lock:
+            tick = item if not isinstance(item, str) else self.get(item)
+            if tick is None: return None
+            if tick.T in self:
+                self.remove(tick.T)
+            if tick.T not in other:
+                other.append(tick)
+            return tick
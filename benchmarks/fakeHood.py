@@ -0,0 +1,485 @@
+'''
+Local stand-in for the Robinhood endpoints KStock uses, login, quotes, fundamentals,
+instruments, positions, portfolios, accounts and orders, with made up latency,
+errors and fills, so the order path can be driven without real money
+
+Prices random walk between requests, orders placed are queued and fill (partially
+first, some of the time) after a drawn delay, and a share of every request can
+be made to fail
+
+    $ python -m benchmarks.fakeHood --port 8800 --latency lognormal:40,0.5 --fill lognormal:800,0.6
+    $ python -m benchmarks.fakeHood --latency orders=const:120 --errors 0.02 --partial 0.3
+'''
+import argparse, datetime, json, math, random, threading, time, uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+
+class Latency():
+    '''
+    A delay distribution, in milliseconds
+
+    Args:
+        spec (str): const:ms, uniform:low,high, normal:mean,sd or lognormal:median,sigma
+        rng (Random): random source, a new one if None
+    '''
+    KINDS = ('const', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, spec, rng = None):
+        kind, _, args = spec.partition(':')
+        if kind not in self.KINDS:
+            raise ValueError('Unknown latency {}, expected one of {}'.format(kind, ', '.join(self.KINDS)))
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(arg) for arg in args.split(',')] if args else [0]
+        self.rng = rng or random.Random()
+
+
+    def draw(self):
+        #A delay in seconds, never negative
+        if self.kind == 'const':
+            ms = self.args[0]
+        elif self.kind == 'uniform':
+            ms = self.rng.uniform(*self.args)
+        elif self.kind == 'normal':
+            ms = self.rng.gauss(*self.args)
+        else:
+            ms = self.rng.lognormvariate(math.log(self.args[0]), self.args[1])
+        return max(ms, 0) / 1000
+
+
+def _stamp(when = None):
+    #Robinhood's updated_at format
+    return datetime.datetime.utcfromtimestamp(when or time.time()).isoformat() + 'Z'
+
+
+class Book():
+    '''
+    The fake brokerage's state, prices, the account and its orders
+
+    Order states are worked out when they're read, an order is queued when placed,
+    partially fills at half of its delay if it's going to and fills once the delay
+    is up, `updated_at` being when that happened rather than when it was read
+
+    Args:
+        base (str): the server's root url, for the urls in responses
+        fill (Latency): delay between an order being placed and it filling
+        partial (float): share of orders that partially fill first
+        reject (float): share of orders that are rejected outright
+        cash (float): cash the account starts with
+        seed (int): random seed for the prices
+    '''
+    PAGE = 100
+
+    def __init__(self, base, fill, partial = 0.2, reject = 0.0, cash = 25000, seed = 0):
+        self.base = base
+        self.fill = fill
+        self.partial = partial
+        self.reject = reject
+        self.cash = cash
+        self.rng = random.Random(seed)
+        #{Sym : [Price, Previous Close, Low, High, Volume, Instrument ID]}
+        self.syms = {}
+        #{Order ID : Order}, in the order they were placed
+        self.orders = {}
+        #{Sym : [Quantity, Average Price]}
+        self.positions = {}
+        self._lock = threading.Lock()
+
+
+    def _sym(self, sym):
+        #The symbol's state, walked a step on every read
+        entry = self.syms.get(sym)
+        if entry is None:
+            price = round(self.rng.uniform(5, 300), 2) if self.rng.random() > 0.1 else round(self.rng.uniform(0.2, 1), 4)
+            entry = self.syms[sym] = [price, price, price, price, 0, str(uuid.uuid5(uuid.NAMESPACE_URL, sym))]
+        else:
+            price = entry[0] * math.exp(self.rng.gauss(0, 0.002))
+            entry[0] = round(price, 2) if price > 1 else round(price, 4)
+            entry[2], entry[3] = min(entry[2], entry[0]), max(entry[3], entry[0])
+            entry[4] += self.rng.randint(100, 5000)
+        return entry
+
+
+    def instrument(self, sym):
+        with self._lock:
+            entry = self.syms.get(sym) or self._sym(sym)
+        return {
+            'id' : entry[5],
+            'symbol' : sym,
+            'tradeable' : True,
+            'maintenance_ratio' : '0.2500',
+            'url' : '{}instruments/{}/'.format(self.base, entry[5])
+        }
+
+
+    def bySymbol(self, instId):
+        for sym, entry in self.syms.items():
+            if entry[5] == instId:
+                return sym
+
+
+    def quote(self, sym):
+        with self._lock:
+            price, prevClose, _, _, _, instId = self._sym(sym)
+        ask = round(price + 0.01, 2) if price > 1 else round(price + 0.0001, 4)
+        return {
+            'symbol' : sym,
+            'last_trade_price' : str(price),
+            'last_extended_hours_trade_price' : str(price),
+            'ask_price' : str(ask),
+            'bid_price' : str(price),
+            'previous_close' : str(prevClose),
+            'instrument' : '{}instruments/{}/'.format(self.base, instId),
+            'updated_at' : _stamp()
+        }
+
+
+    def fundamentals(self, sym):
+        with self._lock:
+            price, prevClose, low, high, volume, _ = self.syms.get(sym) or self._sym(sym)
+        return {
+            'open' : str(prevClose),
+            'high' : str(high),
+            'low' : str(low),
+            'volume' : str(volume),
+            'high_52_weeks' : str(round(high * 1.5, 4)),
+            'low_52_weeks' : str(round(low * 0.5, 4))
+        }
+
+
+    def place(self, form):
+        '''
+        Places an order
+
+        Args:
+            form (dict): the order form place_order posts, symbol, side, price and quantity
+
+        Returns:
+            (dict): the order as Robinhood returns it when it's placed
+        '''
+        now = time.time()
+        sym = form.get('symbol') or self.bySymbol(form.get('instrument', '').rstrip('/').split('/')[-1])
+        delay = self.fill.draw()
+        order = {
+            'id' : str(uuid.uuid4()),
+            'symbol' : sym,
+            'side' : form['side'],
+            'price' : str(form['price']),
+            'quantity' : str(int(float(form['quantity']))),
+            'cumulative_quantity' : '0.00000',
+            'time_in_force' : form.get('time_in_force', 'gfd'),
+            'type' : form.get('type', 'limit'),
+            'state' : 'rejected' if self.rng.random() < self.reject else 'queued',
+            'created_at' : _stamp(now),
+            'updated_at' : _stamp(now),
+            #When the order moves on, dropped from responses
+            '_partial' : now + delay / 2 if self.rng.random() < self.partial else None,
+            '_filled' : now + delay
+        }
+        order['url'] = '{}orders/{}/'.format(self.base, order['id'])
+        with self._lock:
+            self.orders[order['id']] = order
+        return self._public(order)
+
+
+    def _advance(self, order, now):
+        #Brings the order's state up to date, and the account with it when it fills
+        if order['state'] not in ('queued', 'partially_filled'):
+            return
+        qty = int(order['quantity'])
+        if now >= order['_filled']:
+            order['state'], order['updated_at'] = 'filled', _stamp(order['_filled'])
+            order['cumulative_quantity'] = '{:.5f}'.format(qty)
+            self._settle(order, qty)
+        elif order['_partial'] and now >= order['_partial'] and order['state'] == 'queued':
+            order['state'], order['updated_at'] = 'partially_filled', _stamp(order['_partial'])
+            order['cumulative_quantity'] = '{:.5f}'.format(max(qty // 2, 1))
+
+
+    def _settle(self, order, qty):
+        price = float(order['price'])
+        held, avg = self.positions.get(order['symbol'], (0, 0))
+        if order['side'] == 'buy':
+            self.cash -= qty * price
+            self.positions[order['symbol']] = (held + qty, (held * avg + qty * price) / (held + qty))
+        else:
+            self.cash += qty * price
+            self.positions[order['symbol']] = (max(held - qty, 0), avg)
+
+
+    @staticmethod
+    def _public(order):
+        return {key : val for key, val in order.items() if not key.startswith('_')}
+
+
+    def order(self, orderId):
+        with self._lock:
+            order = self.orders.get(orderId)
+            if order is None:
+                return None
+            self._advance(order, time.time())
+            return self._public(order)
+
+
+    def listing(self, since = None, cursor = 0):
+        '''
+        A page of orders, newest first like Robinhood's
+
+        Args:
+            since (str): only orders updated at or after this
+            cursor (int): where the page starts
+
+        Returns:
+            (tuple): (orders, the next cursor or None)
+        '''
+        now = time.time()
+        with self._lock:
+            orders = list(self.orders.values())
+            for order in orders:
+                self._advance(order, now)
+            orders = [self._public(order) for order in reversed(orders)
+                      if since is None or order['updated_at'] >= since]
+        page = orders[cursor:cursor + self.PAGE]
+        return page, cursor + self.PAGE if cursor + self.PAGE < len(orders) else None
+
+
+    def account(self):
+        with self._lock:
+            held = sum(qty * self.syms[sym][0] for sym, (qty, _) in self.positions.items() if sym in self.syms)
+            cash = self.cash
+        return {
+            'url' : self.base + 'accounts/FAKE0001/',
+            'account_number' : 'FAKE0001',
+            'portfolio' : self.base + 'portfolios/FAKE0001/',
+            'margin_balances' : {
+                'unsettled_funds' : '0.0000',
+                'start_of_day_dtbp' : '{:.4f}'.format(cash * 4),
+                'unallocated_margin_cash' : '{:.4f}'.format(cash)
+            }
+        }, cash + held
+
+
+    def positionList(self):
+        with self._lock:
+            return [{
+                'instrument' : '{}instruments/{}/'.format(self.base, self.syms[sym][5]),
+                'quantity' : '{:.4f}'.format(qty),
+                'average_buy_price' : '{:.4f}'.format(avg),
+                'account' : self.base + 'accounts/FAKE0001/'
+            } for sym, (qty, avg) in self.positions.items() if qty]
+
+
+class Handler(BaseHTTPRequestHandler):
+    #Handles a request on the server's thread for it, self.server being the FakeHood
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        #Every request would be printed otherwise
+        pass
+
+
+    def _send(self, code, body = None):
+        data = json.dumps(body if body is not None else {}).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _form(self):
+        size = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(size).decode() if size else ''
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body or '{}')
+        return {key : vals[-1] for key, vals in parse_qs(body).items()}
+
+
+    def _handle(self, method):
+        server = self.server
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key : vals[-1] for key, vals in parse_qs(url.query).items()}
+        endpoint = parts[0] if parts else ''
+        form = self._form() if method == 'POST' else {}
+
+        time.sleep(server.delay(endpoint))
+        server.count(endpoint)
+        if server.failed():
+            return self._send(server.rng.choice((429, 500, 503)), {'detail' : 'Injected error'})
+
+        if endpoint in ('api-token-auth', 'oauth2'):
+            return self._send(200, {'token' : server.token, 'access_token' : server.token,
+                                    'token_type' : 'Bearer', 'expires_in' : 86400})
+        auth = self.headers.get('Authorization', '')
+        if not auth.endswith(server.token):
+            return self._send(401, {'detail' : 'Authentication credentials were not provided.'})
+
+        book = server.book
+        if endpoint in ('quotes', 'fundamentals') and method == 'GET':
+            fetch = book.quote if endpoint == 'quotes' else book.fundamentals
+            if len(parts) > 1:
+                return self._send(200, fetch(parts[1].upper()))
+            syms = [sym for sym in query.get('symbols', '').upper().split(',') if sym]
+            return self._send(200, {'results' : [fetch(sym) for sym in syms]})
+
+        if endpoint == 'instruments' and method == 'GET':
+            if len(parts) > 1:
+                sym = book.bySymbol(parts[1])
+                return self._send(200, book.instrument(sym)) if sym else self._send(404, {'detail' : 'Not found.'})
+            syms = [query['symbol'].upper()] if 'symbol' in query else list(book.syms)
+            return self._send(200, {'results' : [book.instrument(sym) for sym in syms], 'next' : None})
+
+        if endpoint == 'orders':
+            if method == 'POST':
+                return self._send(201, book.place(form))
+            if len(parts) > 1:
+                order = book.order(parts[1])
+                return self._send(200, order) if order else self._send(404, {'detail' : 'Not found.'})
+            since = query.get('updated_at[gte]')
+            page, cursor = book.listing(since, int(query.get('cursor', 0)))
+            after = None
+            if cursor is not None:
+                params = {'cursor' : cursor}
+                if since:
+                    params['updated_at[gte]'] = since
+                after = '{}orders/?{}'.format(server.url, urlencode(params))
+            return self._send(200, {'results' : page, 'next' : after})
+
+        if endpoint == 'positions':
+            return self._send(200, {'results' : book.positionList(), 'next' : None})
+
+        if endpoint in ('accounts', 'portfolios'):
+            account, equity = book.account()
+            if endpoint == 'accounts':
+                return self._send(200, {'results' : [account], 'next' : None})
+            portfolio = {
+                'url' : account['portfolio'],
+                'equity' : '{:.4f}'.format(equity),
+                'extended_hours_equity' : '{:.4f}'.format(equity),
+                'market_value' : '{:.4f}'.format(equity - book.cash)
+            }
+            return self._send(200, {'results' : [portfolio], 'next' : None})
+
+        return self._send(404, {'detail' : 'Not found.'})
+
+
+    def do_GET(self):
+        self._handle('GET')
+
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class FakeHood(ThreadingHTTPServer):
+    '''
+    The fake Robinhood API, served from a background thread on localhost
+
+    Args:
+        port (int): port to listen on, a free one if 0
+        latency (dict): {Endpoint : Latency spec} of the delay before each response,
+            'default' covering the endpoints left out, ie. {'default' : 'lognormal:40,0.5'}
+        fill (str): Latency spec of how long orders take to fill
+        partial (float): share of orders that partially fill first
+        reject (float): share of orders that are rejected
+        errors (float): share of requests answered with a 429/500/503 instead
+        cash (float): cash the account starts with
+        seed (int): random seed, the same seed makes the same prices, delays and errors
+    '''
+    daemon_threads = True
+
+    def __init__(self, port = 0, latency = None, fill = 'lognormal:800,0.6', partial = 0.2,
+                 reject = 0.0, errors = 0.0, cash = 25000, seed = 0):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.url = 'http://127.0.0.1:{}/'.format(self.server_address[1])
+        self.rng = random.Random(seed)
+        self.latency = {endpoint : Latency(spec, self.rng)
+                        for endpoint, spec in dict({'default' : 'const:0'}, **(latency or {})).items()}
+        self.errors = errors
+        self.token = uuid.uuid4().hex
+        self.book = Book(self.url, Latency(fill, self.rng), partial, reject, cash, seed)
+        #{Endpoint : Requests}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+
+    def delay(self, endpoint):
+        with self._lock:
+            return self.latency.get(endpoint, self.latency['default']).draw()
+
+
+    def failed(self):
+        with self._lock:
+            return self.rng.random() < self.errors
+
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+
+    def handle_error(self, request, address):
+        #Clients hanging up, ie. a timed out request, aren't worth a traceback
+        pass
+
+
+    def start(self):
+        '''
+        Starts serving in the background
+
+        Args:
+            None
+
+        Returns:
+            (FakeHood): itself, so it can be started where it's made
+        '''
+        self._thread = threading.Thread(target = self.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def latencies(specs):
+    #Parses spec and endpoint=spec arguments into FakeHood's latency dict
+    latency = {}
+    for spec in specs or []:
+        endpoint, _, dist = spec.rpartition('=')
+        Latency(dist)
+        latency[endpoint or 'default'] = dist
+    return latency
+
+
+def parser(description):
+    #The server options, shared with the latency harness
+    parser = argparse.ArgumentParser(description = description)
+    parser.add_argument('--latency', action = 'append', metavar = '[ENDPOINT=]SPEC',
+                        help = 'response delay, const:ms uniform:lo,hi normal:mean,sd lognormal:median,sigma')
+    parser.add_argument('--fill', default = 'lognormal:800,0.6', help = 'order fill delay')
+    parser.add_argument('--partial', type = float, default = 0.2, help = 'share of orders partially filled first')
+    parser.add_argument('--reject', type = float, default = 0.0, help = 'share of orders rejected')
+    parser.add_argument('--errors', type = float, default = 0.0, help = 'share of requests that fail')
+    parser.add_argument('--seed', type = int, default = 0)
+    return parser
+
+
+if __name__ == '__main__':
+    parser = parser('Serves a fake Robinhood API')
+    parser.add_argument('--port', type = int, default = 8800)
+    args = parser.parse_args()
+
+    server = FakeHood(args.port, latencies(args.latency), args.fill, args.partial,
+                      args.reject, args.errors, seed = args.seed)
+    print('Serving a fake Robinhood on {}, token {}'.format(server.url, server.token))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
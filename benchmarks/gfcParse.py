@@ -0,0 +1,60 @@
+'''
+gfc.parse_prices on multi-day 60s getprices bodies, against the old line by line
+parser plus the per-row timestamp walk Tick.update used to build its stack from
+
+    $ python -m benchmarks.gfcParse
+'''
+import random, timeit
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from resources.gfc import parse_prices
+
+DAYS = (1, 5, 20)
+BARS = 390
+
+
+def payload(days, interval = 60):
+    #A getprices body, each day starting with an a<epoch> row and counting up in intervals
+    random.seed(days)
+    lines = ['EXCHANGE%3DNASDAQ', 'MARKET_OPEN_MINUTE=570', 'MARKET_CLOSE_MINUTE=960',
+             'INTERVAL={}'.format(interval), 'COLUMNS=DATE,CLOSE,HIGH,LOW,OPEN,VOLUME',
+             'DATA=', 'TIMEZONE_OFFSET=-240']
+    price, start = 100.0, 1509370200
+    for day in range(days):
+        for i in range(BARS):
+            price += random.gauss(0, 0.05)
+            row = [round(price, 4), round(price + 0.02, 4), round(price - 0.02, 4), round(price - 0.01, 4), random.randint(100, 9999)]
+            date = 'a{}'.format(start + day * 86400) if i == 0 else str(i)
+            lines.append(','.join([date] + [str(col) for col in row]))
+    return '\n'.join(lines) + '\n'
+
+
+def oldParse(text, interval):
+    #get_price_data and the stack build as they were before
+    data, index, basetime = [], [], 0
+    for price in text.splitlines():
+        cols = price.split(',')
+        if cols[0][0] == 'a':
+            basetime = int(cols[0][1:])
+            index.append(datetime.fromtimestamp(basetime))
+            data.append([float(cols[4]), float(cols[2]), float(cols[3]), float(cols[1]), int(cols[5])])
+        elif cols[0][0].isdigit():
+            date = basetime + (int(cols[0]) * int(interval))
+            index.append(datetime.fromtimestamp(date))
+            data.append([float(cols[4]), float(cols[2]), float(cols[3]), float(cols[1]), int(cols[5])])
+    frame = pd.DataFrame(data, index = index, columns = ['Open', 'High', 'Low', 'Close', 'Volume'])
+    return [int(idx.timestamp() * 1000) for idx in frame.index], frame['Close'].values
+
+
+if __name__ == '__main__':
+    for days in DAYS:
+        text = payload(days)
+        new = parse_prices(text, 60)
+        times, closes = oldParse(text, 60)
+        assert np.array_equal(new.T, times) and np.array_equal(new.Close, closes)
+
+        old = min(timeit.repeat(lambda: oldParse(text, 60), number = 5, repeat = 5)) / 5
+        vec = min(timeit.repeat(lambda: parse_prices(text, 60), number = 5, repeat = 5)) / 5
+        print('{:2} days ({:5} bars): old {:7.2f} ms, new {:6.2f} ms, {:5.1f}x'.format(
+            days, days * BARS, old * 1000, vec * 1000, old / vec))
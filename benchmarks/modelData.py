@@ -0,0 +1,72 @@
+'''
+ObjListTableModel.data() over a 1,000 row Holdings-style model, every cell asked 
+for the roles a paint asks for, against the old per-call getAttrRecursive/QColor data()
+
+    $ QT_QPA_PLATFORM=offscreen python -m benchmarks.modelData
+'''
+import os, random, timeit
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication
+from ObjList import ObjListTableModel, color
+from Tick import Tick
+
+ROWS = 1000
+ROLES = (Qt.DisplayRole, Qt.BackgroundRole, Qt.TextAlignmentRole, Qt.ForegroundRole)
+PROPERTIES = [{'attr' : attr, 'header' : attr} for attr in ('T', 'C', 'Q', 'AP', 'SL', 'tradeable')]
+
+
+def _oldGetAttr(obj, attr):
+    try:
+        p = attr.index('.')
+        return _oldGetAttr(getattr(obj, attr[0:p]), attr[p+1:])
+    except ValueError:
+        return getattr(obj, attr)
+
+
+class OldModel(ObjListTableModel):
+    #data() as it was before the accessors were compiled
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        obj = self.getObject(index)
+        prop = self.getProperty(index)
+        if role == Qt.BackgroundRole:
+            return color(obj.D)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if (obj is None) or (prop is None):
+            return None
+        try:
+            if role in [Qt.DisplayRole, Qt.EditRole]:
+                return _oldGetAttr(obj, prop['attr'])
+        except:
+            return None
+        return None
+
+
+def ticks():
+    random.seed(0)
+    out = []
+    for i in range(ROWS):
+        tick = Tick('T{}'.format(i))
+        tick.C, tick.Q, tick.AP, tick.SL = random.uniform(1, 100), 10, 50.0, 45.0
+        tick.D = random.choice('RG')
+        out.append(tick)
+    return out
+
+
+def paint(model):
+    #One pass over every cell/role, like a full repaint of the table
+    indexes = [model.index(r, c) for r in range(model.rowCount()) for c in range(model.columnCount())]
+    data = model.data
+    return lambda: [data(idx, role) for idx in indexes for role in ROLES]
+
+
+if __name__ == '__main__':
+    app = QApplication([])
+    objs = ticks()
+    for name, cls in (('old data()', OldModel), ('new data()', ObjListTableModel)):
+        run = paint(cls(objs, PROPERTIES))
+        best = min(timeit.repeat(run, number = 5, repeat = 5)) / 5
+        print('{}: {:7.2f} ms per full pass ({} calls)'.format(name, best * 1000, ROWS * len(PROPERTIES) * len(ROLES)))
@@ -0,0 +1,174 @@
+'''
+End to end order latency against the fake Robinhood in benchmarks/fakeHood, the
+quotes come through MarketClient, the orders are placed the way _executeOrder
+places them and their fills are picked up by the OrderTracker the middle-man
+check polls, so what's timed is the app's own path rather than the server's
+
+    quote to order: asking for quotes until the order placed off them is acknowledged
+    order to fill: the order being acknowledged until a poll sees it filled
+
+    $ python -m benchmarks.orderLatency --orders 200 --latency lognormal:40,0.5
+    $ python -m benchmarks.orderLatency --errors 0.05 --partial 0.5 --poll 3
+'''
+import logging, random, threading, time
+from types import SimpleNamespace
+import requests
+from resources.aHood import MarketClient
+from resources.Orders import OrderTracker
+from benchmarks.fakeHood import FakeHood, latencies, parser
+
+
+class Trader():
+    '''
+    The few calls KStock makes on its Robinhood trader, against another API root
+
+    Args:
+        base (str): API root
+    '''
+    def __init__(self, base):
+        self.base = base
+        self.session = requests.Session()
+        self.headers = {'Accept' : 'application/json'}
+        self.session.headers.update(self.headers)
+
+
+    def login(self, username = 'fake', password = 'fake'):
+        res = self.session.post(self.base + 'api-token-auth/', data = {'username' : username, 'password' : password})
+        res.raise_for_status()
+        self.headers['Authorization'] = 'Token ' + res.json()['token']
+        self.session.headers.update(self.headers)
+        self.account = self.session.get(self.base + 'accounts/').json()['results'][0]
+        return True
+
+
+    def place_order(self, symbol, price, quantity, side, time_in_force = 'GFD'):
+        return self.session.post(self.base + 'orders/', data = {
+            'account' : self.account['url'],
+            'symbol' : symbol,
+            'type' : 'limit',
+            'time_in_force' : time_in_force.lower(),
+            'trigger' : 'immediate',
+            'price' : price,
+            'quantity' : quantity,
+            'side' : side
+        }, timeout = 15)
+
+
+    def place_limit_buy_order(self, symbol, time_in_force, price, quantity):
+        return self.place_order(symbol, price, quantity, 'buy', time_in_force)
+
+
+    def place_limit_sell_order(self, symbol, time_in_force, price, quantity):
+        return self.place_order(symbol, price, quantity, 'sell', time_in_force)
+
+
+def percentiles(samples):
+    #p50/p90/p99/max in ms
+    if not samples:
+        return 'no samples'
+    samples = sorted(samples)
+    at = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)] * 1000
+    return 'p50 {:8.1f}  p90 {:8.1f}  p99 {:8.1f}  max {:8.1f} ms  ({})'.format(
+        at(0.5), at(0.9), at(0.99), samples[-1] * 1000, len(samples))
+
+
+def measure(server, syms = 50, orders = 100, rate = 10, poll = 1.0, seed = 0):
+    '''
+    Places orders off fresh quotes at a steady rate while a poller watches for
+    their fills, like the Queue and Middle cycles do
+
+    Args:
+        server (FakeHood): running fake Robinhood
+        syms (int): symbols quoted each round
+        orders (int): orders to place
+        rate (float): orders placed a second
+        poll (float): seconds between OrderTracker polls
+        seed (int): random seed for which symbol is bought
+
+    Returns:
+        (dict): {'Quotes'/'Quote to Order'/'Order to Fill' : [seconds], ...error counts}
+    '''
+    rng = random.Random(seed)
+    symbols = ['S{:03}'.format(i) for i in range(syms)]
+    trader = Trader(server.url)
+    trader.login()
+    market = MarketClient(trader.headers['Authorization'], base = server.url)
+    tracker = OrderTracker(trader, url = server.url + 'orders/')
+
+    stats = {'Quotes' : [], 'Quote to Order' : [], 'Order to Fill' : [],
+             'Quote Errors' : 0, 'Order Errors' : 0, 'Rejected' : 0, 'Poll Errors' : 0}
+    placing = threading.Event()
+    placing.set()
+
+    def poller():
+        while placing.is_set() or len(tracker):
+            time.sleep(poll)
+            try:
+                fills = tracker.poll()
+            except requests.exceptions.RequestException:
+                stats['Poll Errors'] += 1
+                continue
+            now = time.perf_counter()
+            for tick, side, price in fills:
+                stats['Order to Fill'].append(now - tick.placed)
+
+    thread = threading.Thread(target = poller, daemon = True)
+    thread.start()
+
+    for i in range(orders):
+        start = time.perf_counter()
+        ticks = market.robinTicks(symbols)
+        quoted = time.perf_counter()
+        if not ticks:
+            stats['Quote Errors'] += 1
+            continue
+        stats['Quotes'].append(quoted - start)
+
+        tick = rng.choice(ticks)
+        try:
+            res = trader.place_limit_buy_order(symbol = tick['Sym'], time_in_force = 'GFD',
+                                               price = tick['Data']['LTP'], quantity = 1)
+            res.raise_for_status()
+            resp = res.json()
+        except requests.exceptions.RequestException:
+            stats['Order Errors'] += 1
+            continue
+        placed = time.perf_counter()
+        stats['Quote to Order'].append(placed - start)
+
+        if resp['state'] in ('unconfirmed', 'queued'):
+            tracker.track(SimpleNamespace(T = tick['Sym'], transID = (resp['side'], resp['id']), placed = placed))
+        elif resp['state'] not in ('partially_filled', 'filled'):
+            stats['Rejected'] += 1
+
+        time.sleep(max(0, 1 / rate - (time.perf_counter() - start)))
+
+    placing.clear()
+    thread.join()
+    market.close()
+    return stats
+
+
+if __name__ == '__main__':
+    parser = parser('Times the order path against a fake Robinhood')
+    parser.add_argument('--syms', type = int, default = 50, help = 'symbols quoted each round')
+    parser.add_argument('--orders', type = int, default = 100)
+    parser.add_argument('--rate', type = float, default = 10, help = 'orders placed a second')
+    parser.add_argument('--poll', type = float, default = 1.0, help = 'seconds between fill polls')
+    args = parser.parse_args()
+
+    #Connection errors are logged per request, they're counted here instead
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server = FakeHood(latency = latencies(args.latency) or {'default' : 'lognormal:40,0.5'}, fill = args.fill,
+                      partial = args.partial, reject = args.reject, errors = args.errors, seed = args.seed).start()
+    try:
+        stats = measure(server, args.syms, args.orders, args.rate, args.poll, args.seed)
+    finally:
+        server.stop()
+
+    for name in ('Quotes', 'Quote to Order', 'Order to Fill'):
+        print('{:15} {}'.format(name, percentiles(stats[name])))
+    print('Errors: {} quote, {} order, {} poll, {} rejected'.format(
+        stats['Quote Errors'], stats['Order Errors'], stats['Poll Errors'], stats['Rejected']))
+    print('Requests: ' + ', '.join('{} {}'.format(endpoint, num) for endpoint, num in sorted(server.requests.items())))
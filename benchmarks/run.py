@@ -0,0 +1,307 @@
+'''
+Benchmark suite for the hot paths of the 5 second loop, replayed from the recorded
+fixtures in benchmarks/fixtures so every run does the same work
+
+Each case's best time is compared against the JSON baseline and the run fails if
+any is slower by more than the threshold. The baseline is written the first time,
+or whenever --save is given, and is only meaningful on the machine it was saved on
+
+    $ python -m benchmarks.run
+    $ python -m benchmarks.run zigzag Tick.update --repeat 11
+    $ python -m benchmarks.run --save
+    $ python -m benchmarks.run --record
+'''
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import argparse, gc, json, logging, platform, sys, time
+from PyQt5.QtWidgets import QApplication
+import resources.gfc as gfc
+from resources.rHood import Fundamentals, robinTicks
+from ObjList import ObjListTableModel, Transactions
+from Tick import Tick, zigzag
+from Backtest import quote
+from benchmarks import modelData
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PRICES = os.path.join(FIXTURES, 'getprices.txt')
+QUOTES = os.path.join(FIXTURES, 'quotes.json')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+#Ticks the toBuy/toSell cases check, each warmed on its own slice of the fixture
+TICKS = 50
+
+
+def record():
+    '''
+    Writes the fixtures, a two day getprices body and a quotes/fundamentals
+    response pair for 100 symbols from the fake Robinhood
+
+    Args:
+        None
+
+    Returns:
+        None
+    '''
+    from benchmarks.gfcParse import payload
+    from benchmarks.fakeHood import Book, Latency
+
+    os.makedirs(FIXTURES, exist_ok = True)
+    with open(PRICES, 'w') as fileOut:
+        fileOut.write(payload(2))
+
+    book = Book('https://api.robinhood.com/', Latency('const:0'))
+    syms = ['S{:03}'.format(i) for i in range(100)]
+    #A few steps in so the lows, highs and volumes have moved
+    for _ in range(5):
+        quotes = [book.quote(sym) for sym in syms]
+    with open(QUOTES, 'w') as fileOut:
+        json.dump({'quotes' : quotes, 'fundamentals' : [book.fundamentals(sym) for sym in syms]}, fileOut, indent = 1)
+
+
+def _prices():
+    with open(PRICES, 'r') as fileIn:
+        return fileIn.read()
+
+
+def _stream():
+    #The fixture's closes as (epoch ms, quote data), in the shape robinTicks gives Tick.update
+    prices = gfc.parse_prices(_prices(), 60)
+    closes = prices.Close
+    return [(int(stamp), quote(float(close), float(closes[0]), float(closes[:i + 1].min()), float(closes[:i + 1].max())))
+            for i, (stamp, close) in enumerate(zip(prices.T, closes))]
+
+
+_warmed = []
+
+
+def _ticks():
+    #TICKS ticks, each updated over its own rotation of the closes, some scaled down to pennies
+    if not _warmed:
+        stream = _stream()
+        for i in range(TICKS):
+            scale = 0.008 if i % 10 == 0 else 1
+            tick = Tick('W{:02}'.format(i), 1000, spy = 'G')
+            shift = i * len(stream) // TICKS
+            for (stamp, _), (_, data) in zip(stream, stream[shift:] + stream[:shift]):
+                data = quote(round(data['LTP'] * scale, 4), round(data['PC'] * scale, 4),
+                             data['TL'] * scale, data['TH'] * scale)
+                tick.update(data, 1000, 'G', bars = False, stamp = stamp)
+            _warmed.append(tick)
+    return _warmed
+
+
+class Recorded():
+    #A trader that answers quotes_data and the fundamentals requests from the fixture
+    class Response():
+        def __init__(self, body):
+            self.body = body
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.body
+
+
+    def __init__(self):
+        with open(QUOTES, 'r') as fileIn:
+            fixture = json.load(fileIn)
+        self.quotes = {quote['symbol'] : quote for quote in fixture['quotes']}
+        self.funds = dict(zip(self.quotes, fixture['fundamentals']))
+        self.session = self
+
+
+    def quotes_data(self, syms):
+        return [self.quotes[sym] for sym in syms]
+
+
+    def get(self, url, params = None, timeout = None):
+        return self.Response({'results' : [self.funds.get(sym) for sym in params['symbols'].split(',')]})
+
+
+def caseZigzag():
+    closes = gfc.parse_prices(_prices(), 60).Close
+    delta = closes.mean() * 0.01
+    return lambda: zigzag(closes, delta)
+
+
+def caseUpdate():
+    stream = _stream()
+    tick = Tick('FIX', 1000, spy = 'G')
+    def run():
+        for stamp, data in stream:
+            tick.update(data, 1000, 'G', bars = False, stamp = stamp)
+    return run
+
+
+def caseToBuy():
+    ticks = _ticks()
+    for tick in ticks:
+        tick.revert()
+    return lambda: [tick.toBuy(1000, 'G') for tick in ticks]
+
+
+def caseToSell():
+    ticks = _ticks()
+    #Half held under the current price so the peak check runs, half over it
+    for i, tick in enumerate(ticks):
+        tick.open()
+        tick.AP = tick.C * (0.99 if i % 2 else 1.01)
+    return lambda: [tick.toSell(1000, 'G') for tick in ticks]
+
+
+def caseRobinTicks():
+    trader = Recorded()
+    syms = list(trader.quotes)
+    funds = Fundamentals(trader, background = False)
+    funds.get(syms)
+    return lambda: robinTicks(trader, syms, funds = funds)
+
+
+def caseParsePrices():
+    text = _prices()
+    return lambda: gfc.parse_prices(text, 60)
+
+
+def casePriceData():
+    #get_price_data with the request answered by the fixture
+    res = Recorded.Response(None)
+    res.text = _prices()
+    def run():
+        get, gfc.requests.get = gfc.requests.get, lambda *args, **kwargs: res
+        try:
+            return gfc.get_price_data({'q' : 'FIX', 'i' : '60', 'p' : '2d'})
+        finally:
+            gfc.requests.get = get
+    return run
+
+
+def caseModelData():
+    model = ObjListTableModel(modelData.ticks(), modelData.PROPERTIES)
+    return modelData.paint(model)
+
+
+def caseSold():
+    view = Transactions()
+    ticks = modelData.ticks()
+    for tick in ticks:
+        tick.PQ = tick.Q
+        view.bought(tick)
+    return lambda: [view.sold(tick) for tick in ticks]
+
+
+#(Name, setup returning the timed callable, calls per timing), setup runs again before every repeat
+CASES = [
+    ('zigzag', caseZigzag, 100),
+    ('Tick.update', caseUpdate, 5),
+    ('Tick.toBuy', caseToBuy, 500),
+    ('Tick.toSell', caseToSell, 2000),
+    ('robinTicks', caseRobinTicks, 50),
+    ('gfc.parse_prices', caseParsePrices, 50),
+    ('gfc.get_price_data', casePriceData, 20),
+    ('ObjListTableModel.data', caseModelData, 2),
+    #Selling again finds every row closed, so only the first call does the work
+    ('Transactions.sold', caseSold, 1)
+]
+
+
+def bench(setup, number, repeat):
+    '''
+    Times a case, with the collector off like timeit has it
+
+    Args:
+        setup (function): makes the callable to time
+        number (int): calls per timing
+        repeat (int): timings to take the best of
+
+    Returns:
+        (float): best ms per call
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        run = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            best = min(best, (time.perf_counter() - start) / number)
+        finally:
+            gc.enable()
+    return best * 1000
+
+
+def compare(results, baseline, threshold):
+    '''
+    Prints each case against its baseline
+
+    Args:
+        results (dict): {Case : ms}
+        baseline (dict): {Case : ms} of the saved baseline
+        threshold (float): fraction slower a case can be before it's a regression
+
+    Returns:
+        (list): the cases that regressed
+    '''
+    regressed = []
+    for name, ms in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print('{:24} {:10.3f} ms  (no baseline)'.format(name, ms))
+            continue
+        change = ms / base - 1
+        flag = ''
+        if change > threshold:
+            regressed.append(name)
+            flag = '  REGRESSION'
+        print('{:24} {:10.3f} ms  baseline {:10.3f} ms  {:+7.1%}{}'.format(name, ms, base, change, flag))
+    return regressed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmarks the trading hot paths')
+    parser.add_argument('cases', nargs = '*', help = 'cases to run, all of them if none are given')
+    parser.add_argument('--repeat', type = int, default = 10, help = 'timings to take the best of')
+    parser.add_argument('--threshold', type = float, default = 0.25, help = 'fraction slower that fails the run')
+    parser.add_argument('--baseline', default = BASELINE)
+    parser.add_argument('--save', action = 'store_true', help = 'save the results as the baseline')
+    parser.add_argument('--record', action = 'store_true', help = 'rewrite the fixtures and exit')
+    args = parser.parse_args()
+
+    if args.record:
+        record()
+        sys.exit(0)
+
+    unknown = set(args.cases) - {name for name, _, _ in CASES}
+    if unknown:
+        raise SystemExit('Unknown cases {}, expected some of {}'.format(
+            ', '.join(sorted(unknown)), ', '.join(name for name, _, _ in CASES)))
+
+    #The strategy logs its decisions, which would be timed along with it
+    logging.getLogger().setLevel(logging.WARNING)
+    app = QApplication([])
+
+    results = {name : bench(setup, number, args.repeat)
+               for name, setup, number in CASES if not args.cases or name in args.cases}
+
+    saved = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, 'r') as fileIn:
+            saved = json.load(fileIn)
+
+    regressed = compare(results, saved.get('Cases', {}), args.threshold)
+
+    if args.save or not saved:
+        saved = {
+            'Python' : platform.python_version(),
+            'Machine' : platform.machine(),
+            'Processor' : platform.processor(),
+            'Cases' : dict(saved.get('Cases', {}), **results)
+        }
+        with open(args.baseline, 'w') as fileOut:
+            json.dump(saved, fileOut, indent = 1, sort_keys = True)
+        print('Baseline saved to {}'.format(args.baseline))
+    elif regressed:
+        raise SystemExit('{} regressed more than {:.0%}: {}'.format(
+            len(regressed), args.threshold, ', '.join(regressed)))
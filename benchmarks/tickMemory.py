@@ -0,0 +1,71 @@
+'''
+Memory used by 5,000 Ticks with the slotted layout against the old __dict__ 
+layout, each having been updated with one quote
+
+    $ python -m benchmarks.tickMemory
+'''
+import tracemalloc, datetime, gc
+from Tick import Tick
+
+NUM = 5000
+QUOTE = {
+    'LTP' : 12.34, 'LAP' : 12.35, 'C' : 0.21, 'CP' : 1.7, 'PC' : '', 'TH' : 12.5,
+    'TL' : 12.01, 'YH' : 20.12, 'YL' : 8.5, 'V' : 1234567, 'D' : 'G'
+}
+
+
+class DictTick():
+    #The Tick layout before __slots__, everything in __dict__ with '' sentinels
+    def __init__(self, tick = '', spy = ''):
+        self.__dict__.update({
+            'T' : tick, 'C' : '', 'A' : '', 'CP' : [], 'V' : '', 'AV' : '', 'D' : '',
+            'PQ' : 0, 'PC' : '', 'TD' : [], 'YD' : [], 'Q' : None, 'AP' : None,
+            'SL' : None, 'SPY' : spy, 'PV' : [[], []]
+        })
+        self.tradeable = True
+        self.transID = None
+        self.stack = []
+        self.prevProfit = 0
+        self._revert = ()
+        self.trader = ''
+        self.buyRev, self.sellRev = 0, 0
+
+
+    def update(self, data, purPrice, spy):
+        self.stack.append((datetime.datetime.now().time(), data['LTP']))
+        self.__dict__.update({
+            'C' : data['LTP'], 'A' : data['LAP'], 'CP' : (data['C'], data['CP']),
+            'V' : data['V'], 'PC' : data['PC'], 'TD' : [data['TL'], data['TH']],
+            'YD' : [data['YL'], data['YH']], 'D' : data['D'],
+            'PQ' : int(purPrice / data['LTP']), 'SPY' : spy, 'PV' : [[], []]
+        })
+        self._revert = {'Q' : self.Q, 'AP' : self.AP, 'SL' : self.SL, 'Buy' : 0, 'transID' : None}
+
+
+def measure(cls):
+    '''
+    Allocates NUM ticks of `cls`, updates each once
+
+    Args:
+        cls (type): tick class
+
+    Returns:
+        (int): bytes still allocated afterwards
+    '''
+    gc.collect()
+    tracemalloc.start()
+    ticks = []
+    for i in range(NUM):
+        tick = cls('T{}'.format(i), spy = 'G')
+        tick.tradeable = False
+        tick.update(QUOTE, 1000, 'G')
+        ticks.append(tick)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+if __name__ == '__main__':
+    before, after = measure(DictTick), measure(Tick)
+    print('__dict__ Tick: {:8.1f} KiB ({:.0f} B/tick)'.format(before / 1024, before / NUM))
+    print('Slotted Tick:  {:8.1f} KiB ({:.0f} B/tick)'.format(after / 1024, after / NUM))
@@ -0,0 +1 @@
+#Lets pytest import the top level modules (Tick, Backtest, ...) when run from the repo root
@@ -0,0 +1,174 @@
+import h5py, numpy as np, pandas as pd
+import threading, time, logging, pytz
+import resources.gfc as gfc
+
+
+class BarStore():
+    '''
+    On-disk cache of the intraday bars that warm up each Tick's price stack
+
+    Bars are kept in one HDF5 file as /Sym/Interval/YYYYMMDD, each day being a
+    resizable, chunked, gzipped dataset of (T, Open, High, Low, Close, Volume) with
+    T in epoch milliseconds. Only bars newer than what's already stored are ever
+    appended, so a restart reads the day back off disk instead of refetching it
+
+    Args:
+        path (str): where the store is kept
+        chunk (int): bars per chunk, a trading day of minute bars is 390
+        level (int): gzip level
+        gap (int): how many intervals old the newest bar can be before gfc's asked for more
+    '''
+    DTYPE = np.dtype([
+        ('T', '<i8'), ('Open', '<f8'), ('High', '<f8'),
+        ('Low', '<f8'), ('Close', '<f8'), ('Volume', '<i8')
+    ])
+    TZ = pytz.timezone('US/Eastern')
+
+    def __init__(self, path = 'bars.h5', chunk = 512, level = 4, gap = 10):
+        self.path = path
+        self.chunk = chunk
+        self.level = level
+        self.gap = gap
+        self._lock = threading.RLock()
+        self.file = h5py.File(path, 'a')
+
+
+    @classmethod
+    def toBars(cls, prices):
+        '''
+        Converts gfc.get_prices arrays into bars
+
+        Args:
+            prices (PriceData): T and OHLCV arrays
+
+        Returns:
+            (ndarray): bars, oldest first
+        '''
+        bars = np.empty(len(prices.T), cls.DTYPE)
+        for field in cls.DTYPE.names:
+            bars[field] = getattr(prices, field)
+        return np.sort(bars, order = 'T')
+
+
+    def _days(self, stamps):
+        #Trading day of each of the epoch ms times, YYYYMMDD
+        return pd.to_datetime(stamps, unit = 'ms', utc = True).tz_convert(self.TZ).strftime('%Y%m%d')
+
+
+    def days(self, sym, interval = 60):
+        #Days stored for the symbol, oldest first
+        group = self.file.get('{}/{}'.format(sym, interval))
+        return sorted(group.keys()) if group is not None else []
+
+
+    def read(self, sym, interval = 60, day = None):
+        '''
+        Reads a day of bars straight into a new array
+
+        Args:
+            sym (str): ticker symbol
+            interval (int): seconds per bar
+            day (str): YYYYMMDD, the latest stored day if None
+
+        Returns:
+            (ndarray): bars, empty if there aren't any
+        '''
+        with self._lock:
+            if day is None:
+                days = self.days(sym, interval)
+                if not days:
+                    return np.empty(0, self.DTYPE)
+                day = days[-1]
+
+            ds = self.file.get('{}/{}/{}'.format(sym, interval, day))
+            bars = np.empty(ds.shape if ds is not None else 0, self.DTYPE)
+            if len(bars):
+                ds.read_direct(bars)
+            return bars
+
+
+    def append(self, sym, bars, interval = 60):
+        '''
+        Appends whichever of the bars are newer than the ones already stored
+
+        Args:
+            sym (str): ticker symbol
+            bars (ndarray): bars, oldest first
+            interval (int): seconds per bar
+
+        Returns:
+            (int): how many bars were added
+        '''
+        if not len(bars):
+            return 0
+
+        added = 0
+        days = self._days(bars['T'])
+        with self._lock:
+            for day in sorted(set(days)):
+                dayBars = bars[days == day]
+                ds = self.file.get('{}/{}/{}'.format(sym, interval, day))
+                if ds is None:
+                    ds = self.file.create_dataset(
+                        '{}/{}/{}'.format(sym, interval, day),
+                        shape = (0, ),
+                        maxshape = (None, ),
+                        dtype = self.DTYPE,
+                        chunks = (self.chunk, ),
+                        compression = 'gzip',
+                        compression_opts = self.level,
+                        shuffle = True)
+                elif len(ds):
+                    dayBars = dayBars[dayBars['T'] > ds[-1]['T']]
+
+                if len(dayBars):
+                    start = len(ds)
+                    ds.resize((start + len(dayBars), ))
+                    ds[start:] = dayBars
+                    added += len(dayBars)
+
+            self.file.flush()
+
+        return added
+
+
+    def warm(self, stack, sym, interval = 60, fetch = None):
+        '''
+        Fills a price stack with the symbol's latest day of closes, only going to
+        gfc when the stored bars are out of date, and not again within the gap
+
+        Args:
+            stack (PriceStack): stack to fill
+            sym (str): ticker symbol
+            interval (int): seconds per bar
+            fetch (function): gets the bars if they have to be fetched, gfc.get_prices if None
+
+        Returns:
+            (int): how many bars the stack was given
+        '''
+        now = int(time.time() * 1000)
+        stale = self.gap * interval * 1000
+        bars = self.read(sym, interval)
+
+        with self._lock:
+            group = self.file.require_group('{}/{}'.format(sym, interval))
+            fetched = group.attrs.get('Fetched', 0)
+
+        if (not len(bars) or now - bars['T'][-1] > stale) and now - fetched > stale:
+            try:
+                prices = (fetch or gfc.get_prices)({'q': sym, 'i': str(interval), 'p': '1d'})
+            except Exception as e:
+                logging.info('~~~~ {} Bar Fetch Error: {} ~~~~'.format(sym, e))
+            else:
+                with self._lock:
+                    group.attrs['Fetched'] = now
+                    if self.append(sym, self.toBars(prices), interval):
+                        bars = self.read(sym, interval)
+
+        stack.extend(bars['T'], bars['Close'])
+        return len(bars)
+
+
+    def close(self):
+        with self._lock:
+            self.file.close()
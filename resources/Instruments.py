@@ -0,0 +1,150 @@
+import json, os, threading, datetime, logging
+import requests
+
+
+class InstrumentCache():
+    '''
+    On-disk cache of Robinhood instruments (id <-> symbol <-> metadata)
+
+    Instruments barely change, so once fetched they're good for the rest of the
+    day and are kept in a json file so restarts don't have to refetch them. Anything 
+    fetched before today is fetched again the next time it's looked up. Symbols a
+    full prefetch didn't find are kept too, so they aren't looked for again that day
+
+    Args:
+        trader (Robinhood): logged in Robinhood trader object
+        path (str): where the cache is kept
+    '''
+    URL = 'https://api.robinhood.com/instruments/'
+    FIELDS = ('id', 'symbol', 'tradeable', 'maintenance_ratio', 'url')
+
+    def __init__(self, trader, path = 'instruments.json'):
+        self.trader = trader
+        self.path = path
+        #{ID : Metadata}, {Sym : ID}
+        self._byId, self._bySym = {}, {}
+        #{Sym : Date} of symbols Robinhood didn't list
+        self._missing = {}
+        self._lock = threading.RLock()
+
+        if os.path.isfile(path):
+            with open(path, 'r') as fileIn:
+                try:
+                    data = json.load(fileIn)
+                    for inst in data['Instruments']:
+                        self._store(inst, inst['Date'])
+                    self._missing.update(data.get('Missing', {}))
+                except (json.decoder.JSONDecodeError, KeyError, TypeError):
+                    logging.info('~~~~ Instrument Cache Corrupt, Starting Fresh ~~~~')
+
+
+    @staticmethod
+    def today():
+        return datetime.date.today().isoformat()
+
+
+    def _store(self, inst, date = None):
+        meta = {field : inst.get(field) for field in self.FIELDS}
+        meta['Date'] = date or self.today()
+        with self._lock:
+            self._byId[meta['id']] = meta
+            self._bySym[meta['symbol']] = meta['id']
+        return meta
+
+
+    def _fresh(self, meta):
+        return meta is not None and meta['Date'] == self.today()
+
+
+    def byId(self, instId):
+        '''
+        Looks up an instrument by its id
+
+        Args:
+            instId (str): Robinhood instrument id
+
+        Returns:
+            (dict): instrument metadata
+        '''
+        meta = self._byId.get(instId)
+        if not self._fresh(meta):
+            meta = self._store(self.trader.instrument(instId))
+        return meta
+
+
+    def bySymbol(self, sym):
+        '''
+        Looks up an instrument by its ticker symbol
+
+        Args:
+            sym (str): ticker symbol
+
+        Returns:
+            (dict): instrument metadata, None if Robinhood doesn't have it
+        '''
+        meta = self._byId.get(self._bySym.get(sym))
+        if not self._fresh(meta):
+            if self._missing.get(sym) == self.today(): return None
+            results = self.trader.instruments(sym)
+            if not results: return None
+            #The instruments call is a search, prefer the exact match
+            inst = next((inst for inst in results if inst['symbol'] == sym), results[0])
+            meta = self._store(inst)
+        return meta
+
+
+    def prefetch(self, syms):
+        '''
+        Pages through every Robinhood instrument once, caching the ones in `syms` 
+        that aren't already fresh
+
+        Args:
+            syms (list): ticker symbols, the company list universe
+
+        Returns:
+            None
+        '''
+        today = self.today()
+        wanted = set(sym for sym in syms if not self._fresh(self._byId.get(self._bySym.get(sym)))
+                     and self._missing.get(sym) != today)
+        if not wanted: return
+
+        logging.info('Prefetching {} Instruments'.format(len(wanted)))
+        url = self.URL
+        try:
+            while url and wanted:
+                res = self.trader.session.get(url, timeout = 15)
+                res.raise_for_status()
+                page = res.json()
+                for inst in page['results']:
+                    if inst['symbol'] in wanted:
+                        self._store(inst)
+                        wanted.discard(inst['symbol'])
+                url = page['next']
+            #Whatever's left after the whole list isn't on Robinhood
+            with self._lock:
+                self._missing.update(dict.fromkeys(wanted, today))
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logging.info('~~~~ Instrument Prefetch Error: {} ~~~~'.format(e))
+
+        self.save()
+
+
+    def save(self):
+        '''
+        Writes the cache to disk
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        with self._lock:
+            today = self.today()
+            data = {'Instruments' : list(self._byId.values()),
+                    'Missing' : {sym : date for sym, date in self._missing.items() if date == today}}
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as fileOut:
+                json.dump(data, fileOut)
+            os.replace(tmp, self.path)
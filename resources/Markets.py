@@ -1,39 +1,159 @@
-from bs4 import BeautifulSoup
-from urllib.parse import urlencode
+from html.parser import HTMLParser
 from urllib.request import urlopen, Request
 from urllib.error import URLError
 from socket import timeout
-from requests.exceptions import RequestException
-import requests, logging
+import threading, time
+from resources.Metrics import span
 
 
-def fetchMarkets():
-    markets = {
+URL = 'http://money.cnn.com/data/us_markets/'
+#What a failed fetchMarkets raises
+FETCH_ERRORS = (URLError, timeout, ConnectionResetError, ValueError)
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'}
+
+
+def emptyMarkets():
+    return {
         'S&P' : {'Change' : '', 'Quote' : '', 'D' : ''},
         'Dow' : {'Change' : '', 'Quote' : '', 'D' : ''},
         'Nasdaq' : {'Change' : '', 'Quote' : '', 'D' : ''}
     }
-    url = 'http://money.cnn.com/data/us_markets/'
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/61.0.3163.100 Safari/537.36'}\
 
-    try:
-        soup = BeautifulSoup(urlopen(Request(url, headers = headers), timeout = 1).read(), 'html5lib')
 
-        if soup:
-            for market in soup.find('div', {'id' : 'wsod_tickerRoll'}).findAll('li'):
-                quote = market.find('div', {'class' : 'bannerQuote'}).text.strip()
-                change = market.find('span', {'class' : 'quoteChange'}).text
-                markets[market.find('a').text] = {
-                    'Change' : change,
-                    'Quote' : quote,
-                    'D' : 'G' if '+' in change else 'R'
-                }
+class TickerRoll(HTMLParser):
+    '''
+    Pulls the name, quote and change out of each <li> of the ticker roll,
+    only ever fed the ticker roll fragment rather than the whole page
+    '''
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.items = []
+        #Which field the text being read belongs to
+        self._field = None
+
+    def handle_starttag(self, tag, attrs):
+        classes = (dict(attrs).get('class') or '').split()
+        if tag == 'li':
+            self.items.append({'Name' : '', 'Quote' : '', 'Change' : ''})
+        elif not self.items:
+            return
+        elif tag == 'a':
+            self._field = 'Name'
+        elif 'bannerQuote' in classes:
+            self._field = 'Quote'
+        elif 'quoteChange' in classes:
+            self._field = 'Change'
+
+    def handle_endtag(self, tag):
+        if tag in ('a', 'div', 'span'):
+            self._field = None
+
+    def handle_data(self, data):
+        if self._field:
+            self.items[-1][self._field] += data
+
+
+def parseMarkets(page):
+    '''
+    Parses the market data out of the CNN markets page
+
+    Args:
+        page (str): html of the page
+
+    Returns:
+        (dict): Dow, Nasdaq and S&P market data, blank if it wasn't found
+    '''
+    markets = emptyMarkets()
+
+    #Cuts out the ticker roll so only it gets parsed
+    start = page.find('wsod_tickerRoll')
+    if start < 0:
+        return markets
+    start = page.rfind('<', 0, start)
+    end = page.find('</ul>', start)
+    parser = TickerRoll()
+    parser.feed(page[start:end if end > 0 else None])
+    parser.close()
+
+    for item in parser.items:
+        change = item['Change']
+        markets[item['Name'].strip()] = {
+            'Change' : change,
+            'Quote' : item['Quote'].strip(),
+            'D' : 'G' if '+' in change else 'R'
+        }
+
+    return markets
+
+
+def fetchMarkets(wait = 1):
+    '''
+    Fetches the market data off the CNN markets page
+
+    Args:
+        wait (float): seconds before the fetch is given up on
 
-    except (URLError, timeout, ConnectionResetError):
-        logging.info('Market Fetch Timeout')
+    Returns:
+        (dict): Dow, Nasdaq and S&P market data, raises one of FETCH_ERRORS if
+            the page couldn't be fetched or had no quotes on it
+    '''
+    with span('fetchMarkets'):
+        res = urlopen(Request(URL, headers = HEADERS), timeout = wait)
+        markets = parseMarkets(res.read().decode('utf-8', 'replace'))
+
+    if not any(market['Quote'] for market in markets.values()):
+        raise ValueError('No market quotes found')
 
     return markets
 
 
+class MarketFeed():
+    '''
+    Keeps the last good market bar data, so reading it never waits on CNN. The
+    fetches are run by whoever's scheduling them, on their own thread, and a
+    failed one leaves the last good data in place
+
+    Args:
+        wait (float): seconds before a fetch is given up on
+    '''
+    def __init__(self, wait = 2):
+        self.wait = wait
+        self._data = emptyMarkets()
+        #When the last good fetch happened, time.monotonic()
+        self._stamp = None
+        self._lock = threading.Lock()
+
+
+    def fetch(self):
+        '''
+        Fetches the market data now, on the calling thread
+
+        Args:
+            None
+
+        Returns:
+            None, raises one of FETCH_ERRORS if the fetch failed so whoever's
+            scheduling it can back off
+        '''
+        data = fetchMarkets(self.wait)
+        with self._lock:
+            self._data, self._stamp = data, time.monotonic()
+
+
+    def latest(self):
+        '''
+        Last good market data
+
+        Args:
+            None
+
+        Returns:
+            (tuple): (market data dict, seconds since it was fetched or None if never)
+        '''
+        with self._lock:
+            data, stamp = self._data, self._stamp
+        return data, None if stamp is None else time.monotonic() - stamp
+
+
 if __name__ == '__main__':
-    fetchMarkets()
\ No newline at end of file
+    print(fetchMarkets())
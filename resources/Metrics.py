@@ -0,0 +1,293 @@
+import bisect, json, os, threading, time, datetime, logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+#Upper bounds of the histogram buckets in seconds, anything slower goes in +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+#Where the Prometheus text is served from on localhost
+PORT = 9108
+
+
+class Histogram():
+    '''
+    Latencies of one stage, bucketed
+
+    Args:
+        buckets (tuple): bucket upper bounds in seconds, ascending
+    '''
+    __slots__ = ('buckets', 'counts', 'total', 'num', 'most')
+
+    def __init__(self, buckets = BUCKETS):
+        self.buckets = buckets
+        #The last count is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.total, self.num, self.most = 0.0, 0, 0.0
+
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.num += 1
+        if seconds > self.most:
+            self.most = seconds
+
+
+    def quantile(self, q):
+        '''
+        Estimates a quantile as the upper bound of the bucket it falls in
+
+        Args:
+            q (float): 0 to 1
+
+        Returns:
+            (float): seconds, the slowest span seen if it's in +Inf
+        '''
+        want, seen = q * self.num, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= want:
+                return min(bound, self.most)
+        return self.most
+
+
+class Span():
+    #Times a with block into a stage's histogram
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullSpan():
+    #What span gives out while metrics are off, one shared instance that does nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Metrics():
+    '''
+    Collects how long each stage of the update cycle takes
+
+    Spans are aggregated into a histogram per stage. A background thread writes
+    the summary to a JSON file every `flush` seconds, and the histograms are served
+    as Prometheus text on localhost:port/metrics
+
+    Args:
+        path (str): metrics file, not written if None
+        port (int): Prometheus port on localhost, not served if None
+        flush (float): seconds between writes of the metrics file
+        buckets (tuple): histogram bucket upper bounds in seconds
+    '''
+    def __init__(self, path = 'metrics.json', port = PORT, flush = 10, buckets = BUCKETS):
+        self.path = path
+        self.flush = flush
+        self.buckets = buckets
+        #{Stage : Histogram}
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._server = None
+        if port is not None:
+            try:
+                self._server = ThreadingHTTPServer(('127.0.0.1', port), _handler(self))
+                self._server.daemon_threads = True
+                threading.Thread(target = self._server.serve_forever, daemon = True).start()
+            except OSError as e:
+                logging.error('~~~~ Metrics Endpoint Error: {} ~~~~'.format(e))
+                self._server = None
+
+        self._thread = None
+        if path:
+            self._thread = threading.Thread(target = self._run, daemon = True)
+            self._thread.start()
+
+
+    def span(self, name):
+        return Span(self, name)
+
+
+    def observe(self, name, seconds):
+        '''
+        Adds a latency to a stage
+
+        Args:
+            name (str): stage
+            seconds (float): how long it took
+
+        Returns:
+            None
+        '''
+        with self._lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = Histogram(self.buckets)
+            hist.observe(seconds)
+
+
+    def summary(self):
+        '''
+        Count, total, mean, max and estimated quantiles of every stage
+
+        Args:
+            None
+
+        Returns:
+            (dict): {Stage : {Stat : Value}}, times in ms
+        '''
+        with self._lock:
+            return {name : {
+                'Count' : hist.num,
+                'Total' : round(hist.total * 1000, 3),
+                'Mean' : round(hist.total / hist.num * 1000, 3),
+                'Max' : round(hist.most * 1000, 3),
+                'P50' : round(hist.quantile(0.5) * 1000, 3),
+                'P90' : round(hist.quantile(0.9) * 1000, 3),
+                'P99' : round(hist.quantile(0.99) * 1000, 3),
+                'Buckets' : list(hist.counts)
+            } for name, hist in sorted(self.stages.items())}
+
+
+    def prometheus(self):
+        #The histograms in the Prometheus text format, the buckets being cumulative
+        lines = ['# HELP kstock_stage_seconds Time spent in each stage of the update cycle',
+                 '# TYPE kstock_stage_seconds histogram']
+        with self._lock:
+            for name, hist in sorted(self.stages.items()):
+                seen = 0
+                for bound, count in zip(self.buckets + ('+Inf', ), hist.counts):
+                    seen += count
+                    lines.append('kstock_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(name, bound, seen))
+                lines.append('kstock_stage_seconds_sum{{stage="{}"}} {}'.format(name, hist.total))
+                lines.append('kstock_stage_seconds_count{{stage="{}"}} {}'.format(name, hist.num))
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self):
+        '''
+        Writes the summary to the metrics file
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        data = {
+            'Updated' : datetime.datetime.now().isoformat(),
+            'Buckets' : list(self.buckets),
+            'Stages' : self.summary()
+        }
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fileOut:
+            json.dump(data, fileOut, indent = 1)
+        os.replace(tmp, self.path)
+
+
+    def _run(self):
+        while not self._stop.wait(self.flush):
+            try:
+                self.write()
+            except OSError as e:
+                logging.error('~~~~ Metrics Write Error: {} ~~~~'.format(e))
+
+
+    def close(self):
+        '''
+        Writes the metrics file one last time and stops serving
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self.write()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def _handler(metrics):
+    #Request handler serving the metrics' Prometheus text
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+#The Metrics spans go to, None while they're off
+_active = None
+
+
+def span(name):
+    '''
+    Times a with block as a stage, does nothing while metrics are off
+
+        with span('tickUpdate.robinTicks'):
+            tickData = robinTicks(...)
+
+    Args:
+        name (str): stage
+
+    Returns:
+        (Span): context manager, the shared NULL_SPAN while metrics are off
+    '''
+    metrics = _active
+    return NULL_SPAN if metrics is None else Span(metrics, name)
+
+
+def enableMetrics(**kwargs):
+    '''
+    Turns span collection on, taking the Metrics arguments
+
+    Returns:
+        (Metrics): what the spans now go to
+    '''
+    global _active
+    if _active is None:
+        _active = Metrics(**kwargs)
+    return _active
+
+
+def disableMetrics():
+    #Turns span collection off, writing out what's been collected
+    global _active
+    metrics, _active = _active, None
+    if metrics is not None:
+        metrics.close()
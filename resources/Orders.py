@@ -0,0 +1,102 @@
+import datetime, threading, logging
+
+
+class OrderTracker():
+    '''
+    Watches the orders behind the middle-man list
+
+    Rather than asking for every pending order on its own, each poll makes one 
+    (paged) listing call for the orders updated since the last poll, over the 
+    trader's pooled session, and picks the pending ones out of it
+
+    Args:
+        trader (Robinhood): logged in Robinhood trader object
+        url (str): orders endpoint
+        lookback (int): seconds before the first tracked order to start listing from
+    '''
+    URL = 'https://api.robinhood.com/orders/'
+    #States that count as filled for each side
+    FILLED = {
+        'buy' : ('partially_filled', 'filled'),
+        'sell' : ('partially_filled', 'filled', 'confirmed')
+    }
+
+    def __init__(self, trader, url = URL, lookback = 60):
+        self.session = trader.session
+        self.url = url
+        self.lookback = lookback
+        #{Order ID : Tick}
+        self._pending = {}
+        #updated_at[gte] of the next listing
+        self._since = None
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._pending)
+
+
+    def track(self, tick):
+        '''
+        Starts watching a tick's order, `tick.transID` being (side, ID)
+
+        Args:
+            tick (Tick): tick with a pending order
+
+        Returns:
+            None
+        '''
+        with self._lock:
+            if not self._pending:
+                start = datetime.datetime.utcnow() - datetime.timedelta(seconds = self.lookback)
+                self._since = start.isoformat() + 'Z'
+            self._pending[tick.transID[1]] = tick
+
+
+    def poll(self):
+        '''
+        Checks on every pending order at once
+
+        Args:
+            None
+
+        Returns:
+            (list): fills as (Tick, side, price), those orders are no longer tracked
+        '''
+        with self._lock:
+            if not self._pending: return []
+            since = self._since
+
+        #Nothing's changed until every page is in, so a failed page leaves the
+        #orders tracked and the next poll lists them again
+        filled, newest = {}, since
+        url, params = self.url, {'updated_at[gte]' : since}
+        while url:
+            res = self.session.get(url, params = params, timeout = 15)
+            res.raise_for_status()
+            page = res.json()
+            for order in page['results']:
+                try:
+                    newest = max(newest, order['updated_at'])
+                    #Only orders being tracked are looked at any closer
+                    if order['id'] not in self._pending:
+                        continue
+                    if order['state'] in self.FILLED.get(order['side'], ()):
+                        #Market orders have no limit price, the fill's average is what was paid
+                        price = order.get('average_price') or order['price']
+                        filled[order['id']] = (order['side'], float(price))
+                except (KeyError, TypeError, ValueError) as e:
+                    #One bad row shouldn't hold every other fill back
+                    logging.error('~~~~ Unreadable Order {}: {} ~~~~'.format(order.get('id'), e))
+            #The next page link already carries the filter
+            url, params = page['next'], None
+
+        fills = []
+        with self._lock:
+            for orderId, (side, price) in filled.items():
+                tick = self._pending.pop(orderId, None)
+                if tick:
+                    fills.append((tick, side, price))
+            self._since = newest
+
+        return fills
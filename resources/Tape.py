@@ -0,0 +1,257 @@
+import h5py, numpy as np
+import os, threading, time, datetime, heapq, logging, pytz
+from collections import deque
+
+
+#Columns of each of the tape's streams, T being epoch milliseconds
+QUOTES = np.dtype([
+    ('T', '<i8'), ('Sym', 'S8'), ('LTP', '<f8'), ('LAP', '<f8'), ('C', '<f8'), ('CP', '<f8'),
+    ('PC', '<f8'), ('TH', '<f8'), ('TL', '<f8'), ('YH', '<f8'), ('YL', '<f8'), ('V', '<i8'), ('D', 'S1')
+])
+ACCOUNT = np.dtype([
+    ('T', '<i8'), ('Equity', '<f8'), ('AHEquity', '<f8'), ('DTBP', '<f8'), ('Cash', '<f8'), ('Unsettled', '<f8')
+])
+ORDERS = np.dtype([
+    ('T', '<i8'), ('Sym', 'S8'), ('Side', 'S8'), ('State', 'S16'), ('Qty', '<i8'), ('Price', '<f8')
+])
+STREAMS = {'quotes' : QUOTES, 'account' : ACCOUNT, 'orders' : ORDERS}
+
+TZ = pytz.timezone('US/Eastern')
+
+
+def _num(val):
+    #'' and None are NaN
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _day(stamp):
+    return datetime.datetime.fromtimestamp(stamp / 1000, TZ).strftime('%Y%m%d')
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+class TapeRecorder():
+    '''
+    Records what the app sees, each cycle's quotes, the account snapshots and the
+    order events, to a tape file per trading day (folder/YYYYMMDD.h5)
+
+    The record calls only put the data on a queue, converting and writing it is
+    left to a background thread that flushes every `flush` seconds. Each stream is
+    a group of one chunked, gzipped dataset per column
+
+    Args:
+        folder (str): where the tapes are kept
+        flush (float): seconds between writes
+        chunk (int): rows per chunk
+        level (int): gzip level
+    '''
+    def __init__(self, folder = 'tapes', flush = 1.0, chunk = 4096, level = 4):
+        self.folder = folder
+        self.flush = flush
+        self.chunk = chunk
+        self.level = level
+        os.makedirs(folder, exist_ok = True)
+
+        self._pending = deque()
+        self._file, self._day = None, None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+
+    def quotes(self, tickData, stamp = None):
+        #A cycle's robinTicks output, [{'Sym' : Sym, 'Data' : tick metrics}]
+        self._pending.append(('quotes', stamp or _now(), tickData))
+
+
+    def account(self, snap, stamp = None):
+        #An account Snapshot, ones that errored aren't recorded
+        if snap.error is None:
+            self._pending.append(('account', stamp or _now(), snap))
+
+
+    def order(self, sym, side, qty, price, state, stamp = None):
+        '''
+        Records an order event
+
+        Args:
+            sym (str): ticker symbol
+            side (str): Buy/Sell for orders placed, Bought/Sold for fills
+            qty (int): shares
+            price (float): limit or fill price
+            state (str): Robinhood order state, or filled/testing
+
+        Returns:
+            None
+        '''
+        self._pending.append(('orders', stamp or _now(), (sym, side, qty, price, state)))
+
+
+    def _rows(self, kind, stamp, item):
+        #Converts a recorded item into rows of its stream
+        if kind == 'quotes':
+            rows = np.empty(len(item), QUOTES)
+            for row, tick in zip(rows, item):
+                data = tick['Data']
+                row['T'], row['Sym'], row['D'] = stamp, tick['Sym'], data['D'] or ''
+                row['V'] = data['V'] or 0
+                for field in QUOTES.names[2:-2]:
+                    row[field] = _num(data[field])
+            return rows
+
+        if kind == 'account':
+            portfolio, account = item.portfolio, item.account
+            return np.array([(stamp, _num(portfolio['equity']), _num(portfolio['extended_hours_equity']),
+                              _num(account['start_of_day_dtbp']), _num(account['unallocated_margin_cash']),
+                              _num(account['unsettled_funds']))], ACCOUNT)
+
+        sym, side, qty, price, state = item
+        return np.array([(stamp, sym, side, state, qty or 0, _num(price))], ORDERS)
+
+
+    def _open(self, day):
+        if self._file is not None:
+            self._file.close()
+        self._file, self._day = h5py.File(os.path.join(self.folder, day + '.h5'), 'a'), day
+        for kind, dtype in STREAMS.items():
+            group = self._file.require_group(kind)
+            for field in dtype.names:
+                if field not in group:
+                    group.create_dataset(
+                        field,
+                        shape = (0, ),
+                        maxshape = (None, ),
+                        dtype = dtype[field],
+                        chunks = (self.chunk, ),
+                        compression = 'gzip',
+                        compression_opts = self.level,
+                        shuffle = True)
+
+
+    def _write(self):
+        #Drains the queue, the rows of each day and stream going out as one append
+        batches = {}
+        while self._pending:
+            kind, stamp, item = self._pending.popleft()
+            batches.setdefault((_day(stamp), kind), []).append(self._rows(kind, stamp, item))
+
+        for (day, kind), rows in sorted(batches.items()):
+            if day != self._day:
+                self._open(day)
+            rows = np.concatenate(rows)
+            group = self._file[kind]
+            for field in rows.dtype.names:
+                ds = group[field]
+                start = len(ds)
+                ds.resize((start + len(rows), ))
+                ds[start:] = rows[field]
+
+        if batches:
+            self._file.flush()
+
+
+    def _run(self):
+        while not self._stop.wait(self.flush):
+            try:
+                self._write()
+            except Exception as e:
+                logging.error('~~~~ Tape Write Error: {} ~~~~'.format(e))
+
+
+    def close(self):
+        '''
+        Writes whatever's left and closes the tape
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        self._stop.set()
+        self._thread.join()
+        self._write()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TapeReader():
+    '''
+    Streams tapes back in time order, a block of rows at a time
+
+    Args:
+        paths (str/list): tape file(s), or a folder of them, read in day order
+        block (int): rows read from a dataset at once
+    '''
+    def __init__(self, paths, block = 65536):
+        if isinstance(paths, str):
+            paths = sorted(os.path.join(paths, name) for name in os.listdir(paths) if name.endswith('.h5')) \
+                if os.path.isdir(paths) else [paths]
+        self.paths = list(paths)
+        self.block = block
+
+
+    def rows(self, kind):
+        '''
+        Rows of one stream
+
+        Args:
+            kind (str): quotes, account or orders
+
+        Yields:
+            (np.void): rows with the stream's columns
+        '''
+        dtype = STREAMS[kind]
+        for path in self.paths:
+            with h5py.File(path, 'r') as tape:
+                group = tape[kind]
+                size = len(group['T'])
+                for start in range(0, size, self.block):
+                    end = min(start + self.block, size)
+                    rows = np.empty(end - start, dtype)
+                    for field in dtype.names:
+                        rows[field] = group[field][start:end]
+                    yield from rows
+
+
+    def events(self):
+        '''
+        Every stream merged by time
+
+        Yields:
+            (tuple): (epoch ms, quotes/account/orders, row)
+        '''
+        def stream(kind):
+            for row in self.rows(kind):
+                yield int(row['T']), kind, row
+        return heapq.merge(*[stream(kind) for kind in STREAMS], key = lambda event: event[0])
+
+
+    def quotes(self):
+        '''
+        The recorded quotes a cycle at a time, in the shape Backtest.run takes.
+        Rows without a price are skipped
+
+        Yields:
+            (tuple): (epoch ms, {Sym : quote data})
+        '''
+        stamp, cycle = None, {}
+        for row in self.rows('quotes'):
+            #Quotes that failed have no price, and would poison the running sums
+            if not np.isfinite(row['LTP']):
+                continue
+            if row['T'] != stamp and cycle:
+                yield stamp, cycle
+                cycle = {}
+            stamp = int(row['T'])
+            data = {field : float(row[field]) for field in QUOTES.names[2:-2]}
+            data['V'], data['D'] = int(row['V']), row['D'].decode()
+            cycle[row['Sym'].decode()] = data
+        if cycle:
+            yield stamp, cycle
@@ -0,0 +1,154 @@
+import asyncio, threading, logging
+import aiohttp
+from resources.rHood import _metrics
+
+
+class MarketClient():
+    '''
+    asyncio counterpart to robinTicks, quote batches, fundamentals and order
+    lookups are all issued concurrently over one pooled aiohttp session
+
+    The client runs its own event loop on a background thread, so the blocking
+    wrappers (`robinTicks`, `orderStates`) can be called straight from the pool
+    workers and the session's connections are reused between cycles
+
+    Args:
+        auth (str): Robinhood Authorization header, ie. trader.headers['Authorization']
+        base (str): API root, can be pointed at a local stand-in
+        limit (int): most requests in flight at once
+        timeout (float): seconds before a single request is given up on
+        batch (int): symbols per quotes/fundamentals request
+    '''
+    BASE = 'https://api.robinhood.com/'
+
+    def __init__(self, auth = None, base = BASE, limit = 8, timeout = 5, batch = 50):
+        self.base = base.rstrip('/') + '/'
+        self.limit = limit
+        self.timeout = aiohttp.ClientTimeout(total = timeout)
+        self.batch = batch
+        self.headers = {'Accept' : 'application/json'}
+        if auth:
+            self.headers['Authorization'] = auth
+
+        self._session = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target = self._loop.run_forever, daemon = True)
+        self._thread.start()
+        self._sem = None
+
+
+    def _run(self, coro):
+        #Runs a coroutine on the client's loop and waits for it
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+    async def _get(self, path, params = None):
+        if self._session is None:
+            self._sem = asyncio.Semaphore(self.limit)
+            self._session = aiohttp.ClientSession(
+                headers = self.headers,
+                timeout = self.timeout,
+                connector = aiohttp.TCPConnector(limit = self.limit))
+
+        async with self._sem:
+            async with self._session.get(self.base + path, params = params) as res:
+                res.raise_for_status()
+                return await res.json()
+
+
+    async def _batched(self, path, syms):
+        #Splits the symbols into batches, fetches them all at once, results in order
+        batches = [syms[i:i + self.batch] for i in range(0, len(syms), self.batch)]
+        pages = await asyncio.gather(
+            *[self._get(path, {'symbols' : ','.join(batch)}) for batch in batches])
+        return [res for page in pages for res in page['results']]
+
+
+    async def quotes(self, syms):
+        return await self._batched('quotes/', syms)
+
+
+    async def fundamentals(self, syms):
+        '''
+        Fetches fundamentals for the symbols
+
+        Args:
+            syms (list): ticker symbols
+
+        Returns:
+            (dict): {Sym : fundamentals}
+        '''
+        return dict(zip(syms, await self._batched('fundamentals/', syms)))
+
+
+    async def orders(self, ids):
+        '''
+        Looks up the orders concurrently, orders that fail to come back are left out
+
+        Args:
+            ids (list): Robinhood order ids
+
+        Returns:
+            (dict): {ID : order}
+        '''
+        res = await asyncio.gather(
+            *[self._get('orders/{}/'.format(orderId)) for orderId in ids], return_exceptions = True)
+        orders = {}
+        for orderId, order in zip(ids, res):
+            if isinstance(order, Exception):
+                logging.info('~~~~ Order {} Lookup Error: {} ~~~~'.format(orderId, order))
+            else:
+                orders[orderId] = order
+        return orders
+
+
+    async def ticks(self, syms, ah = False):
+        '''
+        Same output as rHood.robinTicks, with the quotes and fundamentals fetched
+        at the same time
+
+        Args:
+            syms (list): ticker symbols
+            ah (bool): whether it's after hours
+
+        Returns:
+            (list): [{'Sym' : Sym, 'Data' : tick metrics}]
+        '''
+        quotes, funds = await asyncio.gather(self.quotes(syms), self.fundamentals(syms))
+        tickList = []
+        try:
+            for quote in quotes:
+                tickList.append({'Sym' : quote['symbol'], 'Data' : _metrics(quote, funds.get(quote['symbol']), ah)})
+        except TypeError:
+            logging.info('~~~~ An Invalid Tick Seems to Exist ~~~~')
+        return tickList
+
+
+    def robinTicks(self, syms, ah = False):
+        #Blocking wrapper of `ticks`
+        try:
+            return self._run(self.ticks(syms, ah))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.info('~~~~ Robinhood Connection Error: {} ~~~~'.format(e))
+            return []
+
+
+    def orderStates(self, ids):
+        #Blocking wrapper of `orders`
+        return self._run(self.orders(ids))
+
+
+    def close(self):
+        '''
+        Closes the session and stops the loop
+
+        Args:
+            None
+
+        Returns:
+            None
+        '''
+        if self._session is not None:
+            self._run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -1,27 +1,62 @@
-import requests, time, json, demjson
+import requests, time, json, demjson, re
+from collections import namedtuple
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from urllib.request import Request, urlopen
 from html.parser import unescape
 
 
-def get_price_data(query):
+#Bars as parallel arrays, T being epoch milliseconds
+PriceData = namedtuple('PriceData', ['T', 'Open', 'High', 'Low', 'Close', 'Volume'])
+
+#Everything that isn't a data row, ie. the header and TIMEZONE_OFFSET lines
+NOT_ROWS = re.compile(r'^[^a\d\r\n][^\n]*\n?', re.M)
+
+
+def parse_prices(text, interval):
+    '''
+    Parses a getprices body in bulk, the rows' numbers are converted by NumPy in
+    one call and the a<epoch> base times are carried down with array arithmetic
+
+    Args:
+        text (str): response body, COLUMNS=DATE,CLOSE,HIGH,LOW,OPEN,VOLUME
+        interval (int): seconds per bar
+
+    Returns:
+        (PriceData): the bars, oldest first
+    '''
+    body = NOT_ROWS.sub('', text).replace('\r', '').strip()
+    if not body:
+        empty = np.empty(0)
+        return PriceData(empty.astype(np.int64), empty, empty, empty, empty, empty.astype(np.int64))
+
+    #A day's first row is a<epoch>, the rest are offsets in intervals from it. The
+    #a becomes a minus sign so those rows come out of the conversion negative
+    cols = np.fromstring(body.replace('a', '-').replace('\n', ','), dtype = np.float64, sep = ',').reshape(-1, 6)
+
+    date = cols[:, 0].astype(np.int64)
+    isBase = date < 0
+    date = np.abs(date)
+    #Each row's base time is the last a<epoch> row at or above it
+    base = np.maximum.accumulate(np.where(isBase, np.arange(len(date)), 0))
+    times = np.where(isBase, date, date[base] + date * int(interval)) * 1000
+
+    return PriceData(times, cols[:, 4], cols[:, 2], cols[:, 3], cols[:, 1], cols[:, 5].astype(np.int64))
+
+
+def get_prices(query):
     r = requests.get("https://finance.google.com/finance/getprices", params=query)
-    lines = r.text.splitlines()
-    data = []
-    index = []
-    basetime = 0
-    for price in lines:
-        cols = price.split(",")
-        if cols[0][0] == 'a':
-            basetime = int(cols[0][1:])
-            index.append(datetime.fromtimestamp(basetime))
-            data.append([float(cols[4]), float(cols[2]), float(cols[3]), float(cols[1]), int(cols[5])])
-        elif cols[0][0].isdigit():
-            date = basetime + (int(cols[0])*int(query['i']))
-            index.append(datetime.fromtimestamp(date))
-            data.append([float(cols[4]), float(cols[2]), float(cols[3]), float(cols[1]), int(cols[5])])
-    return pd.DataFrame(data, index = index, columns = ['Open', 'High', 'Low', 'Close', 'Volume'])
+    return parse_prices(r.text, query['i'])
+
+
+def get_price_data(query):
+    prices = get_prices(query)
+    index = [datetime.fromtimestamp(stamp / 1000) for stamp in prices.T]
+    return pd.DataFrame(
+        {col : getattr(prices, col) for col in PriceData._fields[1:]},
+        index = index,
+        columns = ['Open', 'High', 'Low', 'Close', 'Volume'])
 
 
 def buildNewsUrl(symbol, qs='&start=0&num=5'):
@@ -1,6 +1,15 @@
 from Robinhood import Robinhood
-import requests
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+import requests, threading, time
 import logging
+from resources.Metrics import span
+
+
+#Shared by the account snapshots and the fundamentals refreshes, so the threads
+#are made once rather than every cycle
+_pool = ThreadPoolExecutor(max_workers = 4, thread_name_prefix = 'rHood')
 
 
 logging.basicConfig(format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s', level = logging.INFO)
@@ -77,10 +86,208 @@ def robinTick(trader, tick, ah = False):
     return tickMetrics
 
 
-def robinTicks(trader, ticks, ah = False):
+class Fundamentals():
+    '''
+    Batched, cached access to Robinhood fundamentals
+
+    Fundamentals are fetched for up to `BATCH` symbols a request and every field 
+    is stamped with when it was fetched. A field older than its TTL is still 
+    served, but the symbol is refetched in the background. Past `EXPIRE` TTLs it
+    isn't served anymore and is fetched before returning. Symbols that haven't 
+    been asked for in `IDLE` seconds are dropped
+
+    Args:
+        trader (Robinhood): logged in Robinhood trader object
+        ttl (dict): overrides for the field TTLs, in seconds
+        background (bool): whether stale fields are refreshed in the background, on the shared pool
+    '''
+    URL = 'https://api.robinhood.com/fundamentals/'
+    BATCH = 50
+    TTL = {
+        'high_52_weeks' : 6 * 3600,
+        'low_52_weeks' : 6 * 3600,
+        'high' : 60,
+        'low' : 60,
+        'volume' : 30
+    }
+    EXPIRE = 10
+    IDLE = 15 * 60
+
+    def __init__(self, trader, ttl = None, background = True):
+        self.trader = trader
+        self.ttl = dict(self.TTL, **(ttl or {}))
+        self.background = background
+        #{Sym : {Field : (Value, Fetched)}}
+        self._cache = {}
+        #{Sym : Last Asked For}
+        self._used = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+
+    def _fetch(self, syms):
+        '''
+        Fetches fundamentals for the symbols in batches and caches them
+
+        Args:
+            syms (list): ticker symbols
+
+        Returns:
+            None
+        '''
+        for i in range(0, len(syms), self.BATCH):
+            batch = syms[i:i + self.BATCH]
+            with span('fundamentals.fetch'):
+                res = self.trader.session.get(self.URL, params = {'symbols' : ','.join(batch)}, timeout = 15)
+            res.raise_for_status()
+            now = time.time()
+
+            with self._lock:
+                #Results come back in the same order as the symbols asked for
+                for sym, fund in zip(batch, res.json()['results']):
+                    if fund:
+                        self._cache[sym] = {field : (fund.get(field), now) for field in self.ttl}
+
+
+    def _refresh(self, syms):
+        try:
+            self._fetch(syms)
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            logging.info('~~~~ Fundamentals Refresh Error: {} ~~~~'.format(e))
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(syms)
+
+
+    def get(self, syms):
+        '''
+        Gets the fundamentals for the symbols, from the cache where possible
+
+        Args:
+            syms (list): ticker symbols
+
+        Returns:
+            (dict): {Sym : {Field : Value}}, symbols without fundamentals are left out
+        '''
+        now = time.time()
+        missing, stale = [], []
+
+        with self._lock:
+            for sym in [sym for sym, used in self._used.items() if now - used > self.IDLE]:
+                self._cache.pop(sym, None)
+                del self._used[sym]
+
+            for sym in syms:
+                self._used[sym] = now
+                entry = self._cache.get(sym)
+                if not entry:
+                    missing.append(sym)
+                    continue
+
+                ages = [(now - entry[field][1]) / self.ttl[field] for field in self.ttl]
+                if max(ages) > self.EXPIRE:
+                    missing.append(sym)
+                elif max(ages) > 1 and sym not in self._refreshing:
+                    stale.append(sym)
+
+            self._refreshing.update(stale)
+
+        if missing:
+            #Whatever's cached is still served if the fetch fails
+            try:
+                self._fetch(missing)
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                logging.info('~~~~ Fundamentals Fetch Error: {} ~~~~'.format(e))
+
+        if stale:
+            if self.background:
+                _pool.submit(self._refresh, stale)
+            else:
+                self._refresh(stale)
+
+        with self._lock:
+            return {
+                sym : {field : val[0] for field, val in self._cache[sym].items()}
+                for sym in syms if sym in self._cache
+            }
+
+
+def _metrics(quote, fund, ah = False):
+    '''
+    Normalizes a Robinhood quote and its fundamentals into the tick metrics
+
+    Args:
+        quote (dict): Robinhood quote
+        fund (dict): Robinhood fundamentals for the same symbol
+        ah (bool): whether it's after hours
+
+    Returns:
+        (dict): tick metrics
+    '''
+    if ah:
+        ltp = float(quote['last_extended_hours_trade_price'])
+        lap = float(quote['ask_price'])
+        c = float(quote['last_trade_price'])
+    else:
+        ltp = float(quote['last_trade_price'])
+        lap = float(quote['ask_price'])
+        c = float(quote['previous_close'])
+
+    if ltp > 1:
+        ltp = round(ltp, 2)
+        lap = round(lap, 2)
+
+    c = round(ltp - c, 2)
+    cp = round((c / ltp) * 100, 2) 
+    try:
+        if ltp > 1:
+            yh = round(float(fund['high_52_weeks']), 2)
+            yl = round(float(fund['low_52_weeks']), 2)
+        else:
+            yh = float(fund['high_52_weeks'])
+            yl = float(fund['low_52_weeks'])
+    except TypeError:
+        yh = ''
+        yl = '' 
+
+    return {
+        'LTP' : ltp,
+        'LAP' : lap,
+        'C' : c,
+        'CP' : cp,
+        'PC' : '',
+        'TH' : round(float(fund['high']), 2),
+        'TL' : round(float(fund['low']), 2),
+        'YH' : yh,
+        'YL' : yl,
+        'V' : int(float(fund['volume'])),
+        'D' : 'G' if c > 0 else 'R'
+    }
+
+
+def robinTicks(trader, ticks, ah = False, funds = None):
+    '''
+    Fetches the current metrics for a list of ticks, one quotes call and batched
+    fundamentals
+
+    Args:
+        trader (Robinhood): logged in Robinhood trader object
+        ticks (list): ticker symbols
+        ah (bool): whether it's after hours
+        funds (Fundamentals): fundamentals cache to use, a throw-away one if None
+
+    Returns:
+        (list): [{'Sym' : Sym, 'Data' : tick metrics}]
+    '''
+    if funds is None:
+        funds = Fundamentals(trader, background = False)
+
     tickList = []
     try:
-        ticksQuote = trader.quotes_data(ticks)
+        with span('robinTicks.quotes'):
+            ticksQuote = trader.quotes_data(ticks)
+        with span('robinTicks.fundamentals'):
+            tickFunds = funds.get([tick['symbol'] for tick in ticksQuote])
         for tick in ticksQuote:
             sym = tick['symbol']
             tickMetrics = {
@@ -97,55 +304,61 @@ def robinTicks(trader, ticks, ah = False):
                     'D' : ''
             }
             tickList.append({'Sym' : sym, 'Data' : tickMetrics})
-
-            tickFund = trader.fundamentals(stock = sym)
-            inst = tick['instrument'].split('/')[-2]
-            if ah:
-                ltp = float(tick['last_extended_hours_trade_price'])
-                lap = float(tick['ask_price'])
-                c = float(tick['last_trade_price'])
-                if ltp > 1:
-                    ltp = round(ltp, 2)
-                    lap = round(lap, 2)
-                
-            else:
-                ltp = float(tick['last_trade_price'])
-                lap = float(tick['ask_price'])
-                c = float(tick['previous_close'])
-                if ltp > 1:
-                    ltp = round(ltp, 2)
-                    lap = round(lap, 2)
-                
-
-            c = round(ltp - c, 2)
-            cp = round((c / ltp) * 100, 2) 
-            try:
-                if ltp > 1:
-                    yh = round(float(tickFund['high_52_weeks'], 2))
-                    yl = round(float(tickFund['low_52_weeks'], 2))
-                else:
-                    yh = float(tickFund['high_52_weeks'])
-                    yl = float(tickFund['low_52_weeks'])
-            except TypeError:
-                yh = ''
-                yl = '' 
-
-            tickList[-1]['Data'].update({
-                'LTP' : ltp,
-                'LAP' : lap,
-                'C' : c,
-                'CP' : cp,
-                'TH' : round(float(tickFund['high']), 2),
-                'TL' : round(float(tickFund['low']), 2),
-                'YH' : yh,
-                'YL' : yl,
-                'V' : int(float(tickFund['volume'])),
-                'D' : 'G' if c > 0 else 'R'
-            })
+            tickMetrics.update(_metrics(tick, tickFunds.get(sym), ah))
 
     except TypeError:
         logging.info('~~~~ An Invalid Tick Seems to Exist ~~~~')
     except requests.exceptions.ConnectionError:
         logging.info('~~~~ Robinhood Connection Error ~~~~')
 
-    return tickList
\ No newline at end of file
+    return tickList
+
+
+#Everything MainWindow.update shows about the account, fetched in one go off the GUI thread
+Snapshot = namedtuple('Snapshot', ['portfolio', 'account', 'markets', 'age', 'error'])
+
+EMPTY_PORTFOLIO = MappingProxyType({
+    'equity' : 0,
+    'extended_hours_equity' : 0
+})
+EMPTY_ACCOUNT = MappingProxyType({
+    'unsettled_funds' : 0,
+    'start_of_day_dtbp' : 0,
+    'unallocated_margin_cash' : 0
+})
+
+
+def fetchSnapshot(trader, feed = None):
+    '''
+    Fetches the portfolio and account at the same time, along with whatever the
+    market feed last got, and freezes them into a Snapshot
+
+    Args:
+        trader (Robinhood): logged in Robinhood trader object
+        feed (MarketFeed): market bar feed, markets are left as None without one
+
+    Returns:
+        (Snapshot): read-only portfolio, account and market data, error is set
+            instead if the account couldn't be reached
+    '''
+    markets, age = feed.latest() if feed else (None, None)
+
+    def timed(name, call):
+        with span(name):
+            return call()
+
+    portfolio = _pool.submit(timed, 'snapshot.portfolios', trader.portfolios)
+    account = _pool.submit(timed, 'snapshot.get_account', trader.get_account)
+
+    try:
+        portfolio = MappingProxyType(portfolio.result())
+        account = MappingProxyType(account.result()['margin_balances'])
+    #Thrown when there's nothing in the portfolio
+    except IndexError:
+        logging.error('~~~~ Portfolio Empty ~~~~')
+        portfolio, account = EMPTY_PORTFOLIO, EMPTY_ACCOUNT
+    except (requests.exceptions.ConnectionError,
+            requests.exceptions.HTTPError, TimeoutError) as e:
+        return Snapshot(None, None, markets, age, e)
+
+    return Snapshot(portfolio, account, markets, age, None)
@@ -0,0 +1,44 @@
+import numpy as np
+from Backtest import Backtest, synthetic
+from resources.Tape import TapeRecorder, TapeReader
+
+#0930 Eastern on 20181016, so every cycle lands on the one tape
+START = 1539696600000
+FAILED = dict.fromkeys(['LTP', 'LAP', 'C', 'CP', 'PC', 'TH', 'TL', 'YH', 'YL', 'V', 'D'], '')
+
+
+def record(folder, cycles):
+    #Records each cycle the way _tickUpdate hands over a robinTicks batch
+    tape = TapeRecorder(str(folder), flush = 60)
+    for stamp, quotes in cycles:
+        tape.quotes([{'Sym' : sym, 'Data' : data} for sym, data in quotes.items()], stamp)
+    tape.close()
+    return TapeReader(str(folder))
+
+
+def replay(reader):
+    return Backtest(1000, cash = 25000).run(reader.quotes())
+
+
+def test_failed_cycles_are_skipped(tmp_path):
+    cycles = list(synthetic(20, 400, seed = 3, start = START))
+
+    #A cycle where every quote failed and one where only some did, as robinTicks gives them
+    failed = list(cycles)
+    whole, partial = 150, 151
+    failed.insert(whole, (cycles[whole][0] + 1, {sym : dict(FAILED) for sym in cycles[whole][1]}))
+    stamp, quotes = failed[partial + 1]
+    failed[partial + 1] = (stamp, {sym : dict(FAILED) if i % 3 else data for i, (sym, data) in enumerate(quotes.items())})
+    clean = list(cycles)
+    clean[partial] = (stamp, {sym : data for i, (sym, data) in enumerate(quotes.items()) if not i % 3})
+
+    reader = record(tmp_path / 'failed', failed)
+    replayed = list(reader.quotes())
+    assert len(replayed) == len(cycles)
+    assert all(np.isfinite(data['LTP']) for _, quotes in replayed for data in quotes.values())
+
+    expected = replay(record(tmp_path / 'clean', clean))
+    result = replay(reader)
+    assert result.trades == expected.trades
+    assert result.profit == expected.profit
+    assert result.trades
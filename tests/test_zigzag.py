@@ -0,0 +1,69 @@
+import random
+import pytest
+from numpy import mean
+from Tick import Tick, PriceStack, ZigZag, zigzag
+
+
+def walk(seed, num, start, vol):
+    #A random walk of prices, rounded like quotes are
+    rng = random.Random(seed)
+    prices, price = [], start
+    for _ in range(num):
+        price = max(price * (1 + rng.gauss(0, vol)), 0.0001)
+        prices.append(round(price, 2) if price > 1 else round(price, 4))
+    return prices
+
+
+def batch(prices, scale = 0.01):
+    #What zigzag gives for the whole series, positions as plain ints
+    peaks, valls = zigzag(prices, mean(prices) * scale)
+    return [[(int(pos), val) for pos, val in peaks], [(int(pos), val) for pos, val in valls]]
+
+
+@pytest.mark.parametrize('seed', range(40))
+@pytest.mark.parametrize('start, vol', [(50, 0.004), (150, 0.01), (0.4, 0.02), (0.05, 0.05)])
+def test_streaming_matches_batch(seed, start, vol):
+    prices = walk(seed, 300, start, vol)
+    stack = PriceStack(1024)
+    zz = ZigZag(stack)
+    for i, price in enumerate(prices):
+        stack.append(i, price)
+        zz.update()
+        assert [zz.peaks, zz.valls] == batch(prices[:i + 1])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_extend_matches_batch(seed):
+    #Warm-ups push a day of bars at once before the live prices come in one at a time
+    prices = walk(seed, 500, 20, 0.006)
+    stack = PriceStack(1024)
+    zz = ZigZag(stack)
+    stack.extend(range(390), prices[:390])
+    zz.update()
+    assert [zz.peaks, zz.valls] == batch(prices[:390])
+    for i in range(390, len(prices)):
+        stack.append(i, prices[i])
+        zz.update()
+        assert [zz.peaks, zz.valls] == batch(prices[:i + 1])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_tick_pivots_and_revert(seed):
+    prices = walk(seed, 200, 30, 0.008)
+    tick = Tick('ZZ', 1000, spy = 'G')
+    for i, price in enumerate(prices):
+        data = {'LTP' : price, 'LAP' : price, 'C' : 0, 'CP' : 0, 'PC' : '', 'TH' : price,
+                'TL' : price, 'YH' : '', 'YL' : '', 'V' : 0, 'D' : 'G'}
+        tick.update(data, 1000, 'G', bars = False, stamp = i)
+        if i >= 4:
+            assert tick.PV == batch(prices[:i + 1])
+
+        #Only deciding leaves the position alone, and a buy that doesn't go through
+        #leaves the tick as it was
+        before = (tick.Q, tick.AP, tick.SL, tick.buyRev, tick.transID)
+        decided = tick.toBuy(1000, 'G', opening = False)
+        assert (tick.Q, tick.AP, tick.SL, tick.buyRev, tick.transID) == before
+        assert tick.toBuy(1000, 'G') == decided
+        if decided:
+            tick.revert()
+        assert (tick.Q, tick.AP, tick.SL, tick.buyRev, tick.transID) == before